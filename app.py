@@ -1,24 +1,55 @@
+import time
+_IMPORT_START = time.perf_counter()
 from datetime import timedelta
 from flask import Flask, request, send_from_directory
 from flask_cors import CORS
 from dotenv import load_dotenv
+from werkzeug.utils import import_string
 import os
-from extensions import db, bcrypt, jwt, mail
-from routes import comment_r, contact_r, like_r, post_r, user_r, notification_r
-import cloudinary
-import cloudinary.uploader
+from extensions import db, jwt, mail, cloudinary_uploader
+from services.startup import StartupTimer
 
 load_dotenv()
 
 FRONTEND_URL = os.getenv('FRONTEND_URL', "https://aeedk-frontend.onrender.com")
+PRELOAD_APP = os.getenv('GUNICORN_PRELOAD', 'False') == 'True'
+
+# Routes rarement appelées : le module n'est importé qu'à la première requête
+LAZY_ROUTES = [
+    ('/api/contact/send/', 'contact_bp.send_contact_email', 'routes.contact_r.send_contact_email', ['POST']),
+]
+
+class LazyView:
+    def __init__(self, import_name):
+        self.import_name = import_name
+        self.view = None
+
+    def __call__(self, *args, **kwargs):
+        if self.view is None:
+            self.view = import_string(self.import_name)
+        return self.view(*args, **kwargs)
+
+def prepare_preload(app):
+    # Avec gunicorn --preload, l'app est créée dans le master puis forkée : on charge ici
+    # les intégrations lourdes (partagées en copy-on-write) et on s'assure qu'aucun worker
+    # ne réutilise une connexion ouverte par le master.
+    cloudinary_uploader()
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    def dispose_engines():
+        for engine in engines:
+            engine.dispose(close=False)
 
-cloudinary.config(
-    cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
-    api_key=os.getenv('CLOUDINARY_API_KEY'),
-    api_secret=os.getenv('CLOUDINARY_API_SECRET')
-)
+    os.register_at_fork(after_in_child=dispose_engines)
 
 def create_app():
+    timer = StartupTimer(origin=_IMPORT_START)
+    timer.mark('import.core')
+    from routes import comment_r, like_r, post_r, user_r, notification_r, metrics_r, upload_r, batch_r, sync_r
+    from services import admission, compression, db_routing, idempotency, media_store, metrics, notification_retention, passwords, profiler, ranking, sync
+    timer.mark('import.routes')
+
     app = Flask(__name__, static_folder='frontend/build', static_url_path='/')
 
     frontend_origins = [FRONTEND_URL]
@@ -27,8 +58,8 @@ def create_app():
         app,
         resources={r"/api/*": {"origins": frontend_origins}},
         supports_credentials=True,
-        allow_headers=["Content-Type", "Authorization"],
-        expose_headers=["Authorization"],
+        allow_headers=["Content-Type", "Authorization", profiler.PROFILE_HEADER, idempotency.IDEMPOTENCY_HEADER],
+        expose_headers=["Authorization", idempotency.REPLAYED_HEADER],
         max_age=600,
         methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     )
@@ -38,12 +69,16 @@ def create_app():
         if request.method == 'OPTIONS':
             return '', 200
 
+    database_url = os.getenv('DATABASE_URL') or f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+    replica_url = os.getenv('DATABASE_REPLICA_URL')
+
     app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024
     app.config.update(
         SECRET_KEY=os.getenv('SECRET_KEY', 'devkey'),
         JWT_SECRET_KEY=os.getenv('JWT_SECRET_KEY', 'devjwtkey'),
         JWT_ACCESS_TOKEN_EXPIRES=timedelta(days=30),
-        SQLALCHEMY_DATABASE_URI=f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}",
+        SQLALCHEMY_DATABASE_URI=database_url,
+        SQLALCHEMY_BINDS={db_routing.REPLICA_BIND: replica_url} if replica_url else {},
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
         MAIL_SERVER=os.getenv('MAIL_SERVER'),
         MAIL_PORT=int(os.getenv('MAIL_PORT', 587)),
@@ -52,28 +87,48 @@ def create_app():
         MAIL_PASSWORD=os.getenv('MAIL_PASSWORD'),
         MAIL_DEFAULT_SENDER=os.getenv('MAIL_DEFAULT_SENDER'),
         MAIL_DEBUG=False,
-        SQLALCHEMY_ENGINE_OPTIONS={
-            "pool_recycle": 280,
-            "pool_pre_ping": True
-        },
-        SQLALCHEMY_POOL_SIZE=5,
-        SQLALCHEMY_MAX_OVERFLOW=10,
+        UPLOAD_BACKEND=os.getenv('UPLOAD_BACKEND', 'cloudinary'),
+        SQLALCHEMY_ENGINE_OPTIONS=db_routing.engine_options(database_url),
     )
+    timer.mark('config')
 
     db.init_app(app)
-    bcrypt.init_app(app)
+    db_routing.init_app(app)
+    timer.mark('init.db')
     jwt.init_app(app)
     mail.init_app(app)
+    metrics.init_app(app, db)
+    # enregistré après metrics : la compression est comprise dans la latence mesurée
+    compression.init_app(app)
+    admission.init_app(app)
+    passwords.init_app(app)
+    profiler.init_app(app)
+    ranking.init_app(app)
+    media_store.init_app(app)
+    notification_retention.init_app(app)
+    sync.init_app(app)
+    idempotency.init_app(app)
+    timer.mark('init.extensions')
 
     app.register_blueprint(user_r.user_bp)
     app.register_blueprint(post_r.post_bp)
     app.register_blueprint(like_r.like_bp)
     app.register_blueprint(comment_r.comment_bp)
-    app.register_blueprint(contact_r.contact_bp)
     app.register_blueprint(notification_r.notification_bp)
+    app.register_blueprint(metrics_r.metrics_bp)
+    app.register_blueprint(upload_r.upload_bp)
+    app.register_blueprint(batch_r.batch_bp)
+    app.register_blueprint(sync_r.sync_bp)
+    for rule, endpoint, import_name, methods in LAZY_ROUTES:
+        app.add_url_rule(rule, endpoint=endpoint, view_func=LazyView(import_name), methods=methods)
 
     @app.route('/media/<path:filename>')
     def media(filename):
+        if filename.startswith('blobs/'):
+            # nom = empreinte du contenu : le fichier ne change jamais, cache immuable
+            response = send_from_directory('media', filename, max_age=31536000)
+            response.cache_control.immutable = True
+            return response
         return send_from_directory('media', filename)
 
     @app.route('/<path:path>', methods=['GET'])
@@ -89,6 +144,19 @@ def create_app():
     def serve_index():
         return send_from_directory(app.static_folder, 'index.html')
 
+    @app.cli.command('create-tables')
+    def create_tables_command():
+        # crée uniquement les tables manquantes (ex. post_scores), sans toucher aux existantes
+        db.create_all()
+        print("Tables créées")
+
+    timer.mark('routes')
+
+    if PRELOAD_APP:
+        prepare_preload(app)
+        timer.mark('preload')
+    timer.init_app(app)
+
     return app
 
 if __name__ == "__main__":
@@ -0,0 +1,3 @@
+from app import FRONTEND_URL, create_app
+from routes.async_r import create_asgi_app
+app = create_asgi_app(create_app(), origins=[FRONTEND_URL])
@@ -1,9 +1,46 @@
+import os
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
-from flask_mail import Mail
+from services.db_routing import RoutingSession
 
-db = SQLAlchemy()
-bcrypt = Bcrypt()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
-mail = Mail()
+
+
+class LazyMail:
+    # flask_mail n'est importé et initialisé qu'au premier envoi d'email
+    def init_app(self, app):
+        app.extensions['lazy_mail'] = None
+
+    def _state(self):
+        mail = current_app.extensions.get('lazy_mail')
+        if mail is None:
+            from flask_mail import Mail
+            mail = Mail()
+            mail.init_app(current_app)
+            current_app.extensions['lazy_mail'] = mail
+        return mail
+
+    def send(self, message):
+        self._state().send(message)
+
+
+mail = LazyMail()
+
+_cloudinary_configured = False
+
+
+def cloudinary_uploader():
+    # la configuration Cloudinary (et l'import du SDK) est reportée au premier upload
+    global _cloudinary_configured
+    import cloudinary
+    import cloudinary.uploader
+    if not _cloudinary_configured:
+        cloudinary.config(
+            cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
+            api_key=os.getenv('CLOUDINARY_API_KEY'),
+            api_secret=os.getenv('CLOUDINARY_API_SECRET')
+        )
+        _cloudinary_configured = True
+    return cloudinary.uploader
@@ -0,0 +1,14 @@
+import os
+from prometheus_client import multiprocess
+
+# GUNICORN_PRELOAD=True : l'app est importée une seule fois dans le master (voir prepare_preload)
+preload_app = os.getenv('GUNICORN_PRELOAD', 'False') == 'True'
+# GUNICORN_THREADS > 1 : workers gthread. La même variable dimensionne le pool SQL (db_routing)
+# et active le pool de hachage des mots de passe (services/passwords.py), dont la file bornée
+# renvoie 503 quand tous les process de hachage sont occupés.
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+
+def child_exit(server, worker):
+    # libère les gauges "live" du worker terminé pour qu'elles ne faussent pas l'agrégat
+    multiprocess.mark_process_dead(worker.pid)
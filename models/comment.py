@@ -1,7 +1,11 @@
+import os
 from datetime import datetime
-from app import db
+from sqlalchemy.orm import query_expression
+from extensions import db
 from models.like import Like
 
+COMMENT_MAX_DEPTH = int(os.getenv('COMMENT_MAX_DEPTH', 3))
+
 class Comment(db.Model):
     __tablename__ = 'comments'
     id = db.Column(db.Integer, primary_key=True)
@@ -20,9 +24,23 @@ class Comment(db.Model):
         cascade="all, delete-orphan",
         order_by="Comment.created_at"
     )
+    # compteurs chargés dans la requête principale par les profils de services/loading.py
+    like_count = query_expression()
+    dislike_count = query_expression()
+    reply_total = query_expression()
+
+    __table_args__ = (
+        db.Index('ix_comments_parent_created', 'parent_comment_id', 'created_at'),
+        db.Index('ix_comments_updated', 'updated_at'),
+    )
+
+    def reply_count(self):
+        if self.reply_total is not None:
+            return self.reply_total
+        return Comment.query.filter_by(parent_comment_id=self.id).count()
 
-    def to_dict(self):
-        return {
+    def to_dict(self, max_depth=COMMENT_MAX_DEPTH, depth=0):
+        data = {
             "id": self.id,
             "content": self.content,
             "created_at": self.created_at.isoformat(),
@@ -36,7 +54,18 @@ class Comment(db.Model):
             } if self.user else None,
             "post_id": self.post_id,
             "parent_comment_id": self.parent_comment_id,
-            "children": [child.to_dict() for child in self.children],
-            "likes": Like.query.filter_by(content_type='comment', content_id=self.id, is_like=True).count(),
-            "dislikes": Like.query.filter_by(content_type='comment', content_id=self.id, is_like=False).count(),
+            "likes": self.like_count if self.like_count is not None
+                else Like.query.filter_by(content_type='comment', content_id=self.id, is_like=True).count(),
+            "dislikes": self.dislike_count if self.dislike_count is not None
+                else Like.query.filter_by(content_type='comment', content_id=self.id, is_like=False).count(),
         }
+        if depth < max_depth:
+            data["children"] = [child.to_dict(max_depth, depth + 1) for child in self.children]
+            data["reply_count"] = len(data["children"])
+            data["has_more_replies"] = False
+        else:
+            # profondeur maximale atteinte : le client charge la suite via /<id>/replies
+            data["children"] = []
+            data["reply_count"] = self.reply_count()
+            data["has_more_replies"] = data["reply_count"] > 0
+        return data
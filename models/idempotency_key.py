@@ -0,0 +1,18 @@
+from datetime import datetime
+from extensions import db
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+
+    # une ligne par (route, appelant, en-tête Idempotency-Key) : en cours tant que status_code est NULL,
+    # puis réponse enregistrée, rejouée telle quelle aux nouvelles tentatives jusqu'à expires_at
+    scope = db.Column(db.String(50), primary_key=True)
+    caller = db.Column(db.String(100), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    body = db.Column(db.LargeBinary(length=16 * 1024 * 1024), nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
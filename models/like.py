@@ -1,5 +1,5 @@
 from datetime import datetime
-from app import db
+from extensions import db
 
 class Like(db.Model):
     __tablename__ = 'likes'
@@ -8,13 +8,18 @@ class Like(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     content_type = db.Column(db.String(20), nullable=False)
     content_id = db.Column(db.Integer, nullable=False)
-    is_like = db.Column(db.Boolean, nullable=False)
+    # NULL : vote annulé (la ligne est conservée pour que la bascule reste un simple upsert)
+    is_like = db.Column(db.Boolean, nullable=True)
+    # valeur remplacée par le dernier vote : l'upsert de services/votes.py en déduit son issue
+    previous_is_like = db.Column(db.Boolean, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     user = db.relationship('User', back_populates='likes')
 
     __table_args__ = (
         db.UniqueConstraint('user_id', 'content_type', 'content_id', name='unique_user_like'),
+        db.Index('ix_likes_updated', 'updated_at'),
     )
 
     def to_dict(self):
@@ -25,4 +30,5 @@ class Like(db.Model):
             "content_id": self.content_id,
             "is_like": self.is_like,
             "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
         }
@@ -0,0 +1,25 @@
+from datetime import datetime
+from extensions import db
+
+class MediaBlob(db.Model):
+    __tablename__ = 'media_blobs'
+
+    digest = db.Column(db.String(64), primary_key=True)
+    url = db.Column(db.String(512), unique=True, nullable=False)
+    backend = db.Column(db.String(20), nullable=False)
+    extension = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            "digest": self.digest,
+            "url": self.url,
+            "backend": self.backend,
+            "extension": self.extension,
+            "size": self.size,
+            "ref_count": self.ref_count,
+            "created_at": self.created_at.isoformat(),
+        }
@@ -1,5 +1,5 @@
 from datetime import datetime
-from app import db
+from extensions import db
 
 class Notification(db.Model):
     __tablename__ = 'notification'
@@ -7,14 +7,31 @@ class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     recipient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.String(255), nullable=False)
+    type = db.Column(db.String(32), default='message', nullable=False)
+    target_id = db.Column(db.Integer, nullable=True)
+    actor_id = db.Column(db.Integer, nullable=True)
+    count = db.Column(db.Integer, default=1, nullable=False)
     is_read = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # recherche de la notification à regrouper, et compteur de non lues
+        db.Index('ix_notification_coalesce', 'recipient_id', 'is_read', 'type', 'target_id', 'updated_at'),
+        # purge des anciennes notifications par état de lecture
+        db.Index('ix_notification_retention', 'is_read', 'updated_at'),
+    )
 
     def to_dict(self):
         return {
             "id": self.id,
             "recipient_id": self.recipient_id,
             "message": self.message,
+            "type": self.type,
+            "target_id": self.target_id,
+            "actor_id": self.actor_id,
+            "count": self.count,
             "is_read": self.is_read,
-            "created_at": self.created_at.isoformat()
+            "created_at": self.created_at.isoformat(),
+            "updated_at": (self.updated_at or self.created_at).isoformat()
         }
@@ -0,0 +1,18 @@
+from datetime import datetime
+from extensions import db
+
+class NotificationArchive(db.Model):
+    __tablename__ = 'notification_archive'
+
+    # même identifiant que dans la table notification : pas d'auto-incrément
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    recipient_id = db.Column(db.Integer, nullable=False, index=True)
+    message = db.Column(db.String(255), nullable=False)
+    type = db.Column(db.String(32), nullable=False)
+    target_id = db.Column(db.Integer, nullable=True)
+    actor_id = db.Column(db.Integer, nullable=True)
+    count = db.Column(db.Integer, nullable=False)
+    is_read = db.Column(db.Boolean, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
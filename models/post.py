@@ -1,5 +1,7 @@
 from datetime import datetime
-from app import db
+from sqlalchemy.orm import query_expression
+from extensions import db
+from models.comment import COMMENT_MAX_DEPTH
 from models.like import Like
 
 class Post(db.Model):
@@ -17,6 +19,14 @@ class Post(db.Model):
     status = db.Column(db.String(50), default='published')
     views = db.Column(db.Integer, default=0)
     is_featured = db.Column(db.Boolean, default=False)
+    # compteurs chargés dans la requête principale par les profils de services/loading.py
+    like_count = query_expression()
+    dislike_count = query_expression()
+    comment_total = query_expression()
+
+    __table_args__ = (
+        db.Index('ix_posts_updated', 'updated_at'),
+    )
 
     def count_all_comments(self):
         def count_recursive(comments):
@@ -28,7 +38,7 @@ class Post(db.Model):
         parents = [c for c in self.comments if c.parent_comment_id is None]
         return count_recursive(parents)
 
-    def to_dict(self, include_comments=False):
+    def to_dict(self, comments=None, comment_depth=COMMENT_MAX_DEPTH, comments_has_more=False):
         data = {
             "id": self.id,
             "title": self.title,
@@ -40,14 +50,16 @@ class Post(db.Model):
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
             "status": self.status,
-            "likes": Like.query.filter_by(content_type='post', content_id=self.id, is_like=True).count(),
-            "dislikes": Like.query.filter_by(content_type='post', content_id=self.id, is_like=False).count(),
+            "likes": self.like_count if self.like_count is not None
+                else Like.query.filter_by(content_type='post', content_id=self.id, is_like=True).count(),
+            "dislikes": self.dislike_count if self.dislike_count is not None
+                else Like.query.filter_by(content_type='post', content_id=self.id, is_like=False).count(),
             "views": self.views,
             "is_featured": self.is_featured,
-            "comments_count": self.count_all_comments(),
+            "comments_count": self.comment_total if self.comment_total is not None else self.count_all_comments(),
         }
-        if include_comments:
-            data["comments"] = [
-                comment.to_dict() for comment in self.comments if comment.parent_comment_id is None
-            ]
+        if comments is not None:
+            # une page de commentaires racine chargée par l'appelant (routes.comment_r.top_level_page)
+            data["comments"] = [comment.to_dict(comment_depth) for comment in comments]
+            data["comments_has_more"] = comments_has_more
         return data
@@ -0,0 +1,17 @@
+from datetime import datetime
+from extensions import db
+
+class PostScore(db.Model):
+    __tablename__ = 'post_scores'
+
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), primary_key=True)
+    likes = db.Column(db.Integer, default=0, nullable=False)
+    dislikes = db.Column(db.Integer, default=0, nullable=False)
+    comments = db.Column(db.Integer, default=0, nullable=False)
+    is_pinned = db.Column(db.Boolean, default=False, nullable=False)
+    score = db.Column(db.Float, default=0, nullable=False)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_post_scores_rank', 'is_pinned', 'score'),
+    )
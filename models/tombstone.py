@@ -0,0 +1,18 @@
+from datetime import datetime
+from extensions import db
+
+class Tombstone(db.Model):
+    __tablename__ = 'tombstones'
+
+    # trace d'un contenu supprimé, pour que /api/sync puisse le signaler aux clients
+    id = db.Column(db.Integer, primary_key=True)
+    content_type = db.Column(db.String(20), nullable=False)
+    content_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            "content_type": self.content_type,
+            "content_id": self.content_id,
+            "deleted_at": self.deleted_at.isoformat(),
+        }
@@ -0,0 +1,8 @@
+from extensions import db
+
+class UsedUpload(db.Model):
+    __tablename__ = 'used_uploads'
+
+    # URL d'upload signée déjà utilisée : une signature ne sert qu'une fois, jusqu'à son expiration
+    key = db.Column(db.String(255), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
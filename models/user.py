@@ -1,6 +1,6 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-from app import db
+from extensions import db
+from services import passwords
 
 class User(db.Model):
     __tablename__ = "user"
@@ -27,12 +27,12 @@ class User(db.Model):
     likes = db.relationship('Like', back_populates='user', cascade='all, delete-orphan')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256', salt_length=16)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
         if not self.password_hash:
             return False
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify_password(self.password_hash, password)
 
     def to_dict(self):
         default_avatar_url = "https://collection.cloudinary.com/dk6mvlzji/510146622a6b9787c7454c15adb84e7c"
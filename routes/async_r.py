@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from functools import wraps
+from a2wsgi import WSGIMiddleware
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import and_, func, or_, select
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.test import EnvironBuilder
+from models.comment import COMMENT_MAX_DEPTH, Comment
+from models.notification import Notification
+from models.post import Post
+from routes.comment_r import COMMENTS_PER_PAGE, MAX_PER_PAGE, decode_cursor, encode_cursor, top_level_page
+from services import loading, metrics, ranking
+from services.async_db import AsyncDatabase
+from services.compression import COMPRESS_GZIP_LEVEL, COMPRESS_MIN_SIZE
+from services.db_routing import WORKER_THREADS
+from services.votes import vote_summary
+
+# Variante asynchrone (ASGI, voir asgi.py) des routes de lecture les plus sollicitées.
+# Mêmes modèles, mêmes profils de chargement et même to_dict() que les routes Flask : le code
+# synchrone s'exécute via AsyncSession.run_sync, les accès à la base restant non bloquants.
+# Le JSON est produit par le fournisseur JSON de l'app Flask, il est donc identique octet pour
+# octet. Toutes les autres requêtes sont transmises à l'app Flask (pool de threads WSGI).
+ASYNC_SSE_INTERVAL = float(os.getenv('ASYNC_SSE_INTERVAL', 5))
+ASYNC_SSE_MAX_SECONDS = int(os.getenv('ASYNC_SSE_MAX_SECONDS', 300))
+ASYNC_SSE_RETRY_MS = int(os.getenv('ASYNC_SSE_RETRY_MS', 5000))
+# threads servant l'app Flask : chacun peut tenir une connexion du pool synchrone (db_routing)
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', WORKER_THREADS))
+
+logger = logging.getLogger(__name__)
+
+
+def _arg(request, name, default=None):
+    # même comportement que request.args.get(name, default, type=int) côté Flask
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def _requested_depth(request):
+    return min(max(_arg(request, 'depth', COMMENT_MAX_DEPTH), 0), COMMENT_MAX_DEPTH)
+
+
+def _json(request, data, status=200):
+    body = request.app.state.flask_app.json.response(data).get_data()
+    return Response(body, status_code=status, media_type='application/json')
+
+
+def _identity(request):
+    # mêmes vérifications et mêmes réponses d'erreur que @jwt_required() côté Flask
+    flask_app = request.app.state.flask_app
+    headers = {'Authorization': request.headers['Authorization']} if 'Authorization' in request.headers else {}
+    builder = EnvironBuilder(path=request.url.path, headers=headers)
+    with flask_app.request_context(builder.get_environ()):
+        try:
+            verify_jwt_in_request()
+            return get_jwt_identity(), None
+        except Exception as e:
+            error = flask_app.make_response(flask_app.handle_user_exception(e))
+            return None, Response(error.get_data(), status_code=error.status_code, media_type=error.mimetype)
+
+
+def _timed(route, view):
+    @wraps(view)
+    async def wrapped(request):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await view(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics.REQUEST_LATENCY.labels(
+                blueprint='async', route=route, method=request.method, status=str(status)
+            ).observe(time.perf_counter() - start)
+    return wrapped
+
+
+# --- lectures synchrones, exécutées par AsyncSession.run_sync ---
+
+def _posts(session, sort, page, per_page):
+    query = ranking.trending_select() if sort == 'trending' else select(Post).order_by(Post.created_at.desc())
+    query = query.options(*loading.profile('feed'))
+    if per_page:
+        query = query.offset((max(page, 1) - 1) * per_page).limit(per_page)
+    return [post.to_dict() for post in session.scalars(query)]
+
+
+def _post(session, post_id, depth):
+    post = session.get(Post, post_id, options=loading.profile('post_detail'))
+    if post is None:
+        return None
+    comments, has_more = top_level_page(session, post_id, 1, COMMENTS_PER_PAGE, depth)
+    return post.to_dict(comments=comments, comment_depth=depth, comments_has_more=has_more)
+
+
+def _comments(session, post_id, page, per_page, depth):
+    if session.get(Post, post_id) is None:
+        return None
+    parent_comments, has_more = top_level_page(session, post_id, page, per_page, depth)
+    total_comments = session.scalar(select(func.count(Comment.id)).where(Comment.post_id == post_id))
+    return {
+        "comments": [comment.to_dict(depth) for comment in parent_comments],
+        "total": total_comments,
+        "page": page,
+        "per_page": per_page,
+        "has_more": has_more,
+    }
+
+
+def _replies(session, comment_id, limit, depth, cursor):
+    if session.scalar(select(Comment.id).filter_by(id=comment_id)) is None:
+        return None
+    query = select(Comment).options(*loading.profile('comment_thread', depth=depth))\
+        .where(Comment.parent_comment_id == comment_id)
+    if cursor:
+        created_at, last_id = cursor
+        query = query.where(or_(
+            Comment.created_at > created_at,
+            and_(Comment.created_at == created_at, Comment.id > last_id),
+        ))
+    replies = session.scalars(query.order_by(Comment.created_at, Comment.id).limit(limit + 1)).all()
+    has_more = len(replies) > limit
+    replies = replies[:limit]
+    return {
+        "replies": [reply.to_dict(depth) for reply in replies],
+        "next_cursor": encode_cursor(replies[-1]) if has_more else None,
+        "has_more": has_more,
+    }
+
+
+def _unread_count(session, user_id):
+    return session.scalar(
+        select(func.count(Notification.id)).filter_by(recipient_id=user_id, is_read=False)
+    )
+
+
+async def _read(request, fn, *args):
+    async with request.app.state.database.session(request.cookies) as session:
+        return await session.run_sync(fn, *args)
+
+
+# --- routes ---
+
+async def get_posts(request):
+    try:
+        data = await _read(
+            request, _posts, request.query_params.get('sort'), _arg(request, 'page', 1), _arg(request, 'per_page')
+        )
+        return _json(request, data)
+    except Exception:
+        logger.exception("Erreur lors du chargement des posts")
+        return _json(request, {"error": "Erreur serveur"}, 500)
+
+
+async def get_post(request):
+    depth = _requested_depth(request)
+    data = await _read(request, _post, request.path_params['post_id'], depth)
+    if data is None:
+        return _json(request, {"error": "Post non trouvé"}, 404)
+    return _json(request, data)
+
+
+async def list_comments(request):
+    page = max(_arg(request, 'page', 1), 1)
+    per_page = min(max(_arg(request, 'per_page', COMMENTS_PER_PAGE), 1), MAX_PER_PAGE)
+    data = await _read(request, _comments, request.path_params['post_id'], page, per_page, _requested_depth(request))
+    if data is None:
+        return _json(request, {"error": "Post non trouvé"}, 404)
+    return _json(request, data)
+
+
+async def list_replies(request):
+    limit = min(max(_arg(request, 'limit', COMMENTS_PER_PAGE), 1), MAX_PER_PAGE)
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        try:
+            cursor = decode_cursor(cursor)
+        except ValueError:
+            return _json(request, {"error": "Curseur invalide"}, 400)
+    data = await _read(
+        request, _replies, request.path_params['comment_id'], limit, _requested_depth(request), cursor
+    )
+    if data is None:
+        return _json(request, {"error": "Commentaire non trouvé"}, 404)
+    return _json(request, data)
+
+
+async def get_likes_info(request):
+    content_type = request.path_params['content_type']
+    if content_type not in ['post', 'comment']:
+        return _json(request, {"error": "Type de contenu invalide"}, 400)
+    data = await _read(
+        request, lambda session: vote_summary(
+            content_type, request.path_params['content_id'], _arg(request, 'user_id'), session=session
+        )
+    )
+    return _json(request, data)
+
+
+async def get_unread_notifications_count(request):
+    user_id, error = _identity(request)
+    if error:
+        return error
+    return _json(request, {"unread_count": await _read(request, _unread_count, user_id)})
+
+
+async def stream_unread_notifications_count(request):
+    # SSE : pousse le compteur à chaque changement, un commentaire ": ping" sinon.
+    # Le flux se ferme après ASYNC_SSE_MAX_SECONDS, le client se reconnecte (retry).
+    user_id, error = _identity(request)
+    if error:
+        return error
+    dumps = request.app.state.flask_app.json.dumps
+
+    async def events():
+        yield f"retry: {ASYNC_SSE_RETRY_MS}\n\n"
+        last = None
+        deadline = time.monotonic() + ASYNC_SSE_MAX_SECONDS
+        while time.monotonic() < deadline:
+            count = await _read(request, _unread_count, user_id)
+            if count != last:
+                yield f"data: {dumps({'unread_count': count})}\n\n"
+                last = count
+            else:
+                yield ": ping\n\n"
+            await asyncio.sleep(ASYNC_SSE_INTERVAL)
+
+    return StreamingResponse(
+        events(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+ROUTES = [
+    ('/api/posts', get_posts),
+    ('/api/posts/{post_id:int}', get_post),
+    ('/api/comments/post/{post_id:int}', list_comments),
+    ('/api/comments/{comment_id:int}/replies', list_replies),
+    ('/api/likes/{content_type}/{content_id:int}', get_likes_info),
+    ('/api/notifications/unread_count', get_unread_notifications_count),
+    ('/api/notifications/unread_count/stream', stream_unread_notifications_count),
+]
+
+
+def create_asgi_app(flask_app, origins):
+    database = AsyncDatabase(flask_app.config)
+    flask_wsgi = WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+    # CORS et compression appliqués aux seules routes asynchrones : l'app Flask a les siens
+    middleware = [
+        Middleware(
+            CORSMiddleware, allow_origins=origins, allow_credentials=True, expose_headers=['Authorization']
+        ),
+        Middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE, compresslevel=COMPRESS_GZIP_LEVEL),
+    ]
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await database.dispose()
+
+    reads = Starlette(
+        routes=[Route(path, _timed(path, view), methods=['GET'], middleware=middleware) for path, view in ROUTES],
+        lifespan=lifespan,
+    )
+    reads.state.flask_app = flask_app
+    reads.state.database = database
+    # tout ce qui n'est pas une route asynchrone part, tel quel, vers l'app Flask
+    reads.router.default = flask_wsgi
+    reads.router.redirect_slashes = False
+
+    async def app(scope, receive, send):
+        # les écritures et les pré-requêtes CORS (OPTIONS) restent servies par Flask
+        if scope['type'] == 'http' and scope['method'] not in ('GET', 'HEAD'):
+            await flask_wsgi(scope, receive, send)
+        else:
+            await reads(scope, receive, send)
+
+    return app
@@ -0,0 +1,70 @@
+from flask import Blueprint, current_app, g, jsonify, request
+from urllib.parse import urlsplit
+from werkzeug.test import EnvironBuilder
+import os
+from extensions import db
+
+batch_bp = Blueprint('batch', __name__, url_prefix='/api/batch')
+
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+# seuls les en-têtes d'identité sont transmis aux sous-requêtes
+FORWARDED_HEADERS = ('Authorization', 'Cookie', 'Accept-Language', 'User-Agent')
+
+
+def _sub_request_error(item_id, status, message):
+    return {"id": item_id, "status": status, "body": {"error": message}}
+
+
+def _dispatch(app, item_id, path):
+    parts = urlsplit(path)
+    builder = EnvironBuilder(
+        path=parts.path,
+        query_string=parts.query,
+        method='GET',
+        base_url=request.host_url,
+        headers={name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers},
+        environ_base={'REMOTE_ADDR': request.remote_addr},
+    )
+    # Les sous-requêtes réutilisent le contexte applicatif de la requête batch, donc la même
+    # session SQLAlchemy (et sa map d'identité : l'utilisateur courant n'est chargé qu'une fois).
+    # g est en revanche isolé pour que les hooks (métriques, profiler, routage) restent par requête.
+    saved = dict(vars(g))
+    try:
+        with app.request_context(builder.get_environ()):
+            response = app.full_dispatch_request()
+    except Exception:
+        app.logger.exception("Échec de la sous-requête batch %s", path)
+        db.session.rollback()
+        return _sub_request_error(item_id, 500, "Erreur interne du serveur")
+    finally:
+        wrote = g.get('db_wrote')
+        vars(g).clear()
+        vars(g).update(saved)
+        if wrote:
+            g.db_wrote = True
+    body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+    return {"id": item_id, "status": response.status_code, "body": body}
+
+
+@batch_bp.route('', methods=['POST'])
+def run_batch():
+    data = request.get_json(silent=True) or {}
+    items = data.get('requests')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Liste de requêtes requise"}), 400
+    if len(items) > BATCH_MAX_REQUESTS:
+        return jsonify({"error": f"Maximum {BATCH_MAX_REQUESTS} requêtes par batch"}), 400
+
+    app = current_app._get_current_object()
+    responses = []
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        item_id = item.get('id', index)
+        path = item.get('path')
+        if str(item.get('method', 'GET')).upper() != 'GET':
+            responses.append(_sub_request_error(item_id, 405, "Seules les requêtes GET sont acceptées"))
+        elif not isinstance(path, str) or not path.startswith('/api/') or path.startswith(batch_bp.url_prefix):
+            responses.append(_sub_request_error(item_id, 400, "Chemin de sous-requête invalide"))
+        else:
+            responses.append(_dispatch(app, item_id, path))
+    return jsonify({"responses": responses}), 200
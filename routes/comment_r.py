@@ -1,23 +1,60 @@
+import base64
+import os
+from datetime import datetime
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-from app import db
-from models.comment import Comment
-from models.notification import Notification
+from sqlalchemy import and_, func, or_, select
+from extensions import db
+from models.comment import COMMENT_MAX_DEPTH, Comment
 from models.user import User
 from models.post import Post
+from services import idempotency, loading, notifications, ranking
+from services.deletion import delete_comment_tree
 
 comment_bp = Blueprint('comment_bp', __name__, url_prefix='/api/comments')
 
+COMMENTS_PER_PAGE = int(os.getenv('COMMENTS_PER_PAGE', 20))
+MAX_PER_PAGE = 100
+
+
+def _requested_depth():
+    return min(max(request.args.get('depth', COMMENT_MAX_DEPTH, type=int), 0), COMMENT_MAX_DEPTH)
+
+
+def encode_cursor(comment):
+    raw = f"{comment.created_at.isoformat()}|{comment.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    # toutes les erreurs de décodage (base64, utf-8, format) sont des ValueError
+    created_at, last_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(created_at), int(last_id)
+
+
+def top_level_page(session, post_id, page, per_page, depth):
+    # une page de commentaires racine (plus récents d'abord) et l'indicateur has_more :
+    # partagée par list_comments, le détail d'un post et les routes asynchrones
+    comments = session.scalars(
+        select(Comment).options(*loading.profile('comment_thread', depth=depth))
+        .filter_by(post_id=post_id, parent_comment_id=None)
+        .order_by(Comment.created_at.desc())
+        .offset((page - 1) * per_page).limit(per_page + 1)
+    ).all()
+    return comments[:per_page], len(comments) > per_page
+
 
 @comment_bp.route('/', methods=['GET'])
 @cross_origin()
 def get_all_comments():
-    comments = Comment.query.order_by(Comment.created_at.desc()).all()
+    comments = Comment.query.options(*loading.profile('comment_thread', depth=COMMENT_MAX_DEPTH))\
+        .order_by(Comment.created_at.desc()).all()
     return jsonify({"comments": [c.to_dict() for c in comments]}), 200
 
 
 @comment_bp.route('/', methods=['POST'])
 @cross_origin()
+@idempotency.idempotent('create_comment')
 def create_comment():
     try:
         data = request.get_json(force=True)
@@ -35,47 +72,74 @@ def create_comment():
     if not content or not post_id or not user_id:
         return jsonify({"error": "Le contenu, l'id du post et l'id utilisateur sont requis"}), 400
 
-    user = User.query.get(user_id)
-    if not user:
+    try:
+        user_id, post_id = int(user_id), int(post_id)
+        parent_comment_id = int(parent_comment_id) if parent_comment_id else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "Identifiants invalides"}), 400
+
+    # une seule requête de validation : utilisateur, post cible et post du commentaire parent
+    found = db.session.execute(
+        select(User.username, User.avatar, Post.author_id, Post.title, Post.created_at, Comment.post_id)
+        .select_from(User)
+        .outerjoin(Post, Post.id == post_id)
+        .outerjoin(Comment, Comment.id == parent_comment_id)
+        .where(User.id == user_id)
+    ).first()
+    if not found:
         return jsonify({"error": "Utilisateur non trouvé"}), 404
-
-    post = Post.query.get(post_id)
-    if not post:
+    username, avatar, post_author_id, post_title, post_created_at, parent_post_id = found
+    if post_author_id is None:
         return jsonify({"error": "Post non trouvé"}), 404
+    if parent_comment_id and parent_post_id != post_id:
+        return jsonify({"error": "Commentaire parent invalide"}), 400
 
-    if parent_comment_id:
-        parent_comment = Comment.query.get(parent_comment_id)
-        if not parent_comment or parent_comment.post_id != post_id:
-            return jsonify({"error": "Commentaire parent invalide"}), 400
-
+    now = datetime.utcnow()
     comment = Comment(
         content=content,
         user_id=user_id,
         post_id=post_id,
-        parent_comment_id=parent_comment_id
+        parent_comment_id=parent_comment_id,
+        created_at=now,
+        updated_at=now,
+        is_moderated=False,
     )
     db.session.add(comment)
+    if post_author_id != user_id:
+        notifications.notify(post_author_id, 'comment', post_id, user_id, post_title)
+    db.session.flush()
+    ranking.bump_comments(post_id, post_created_at, 1)
+
+    # réponse construite à partir des valeurs connues : un nouveau commentaire n'a ni
+    # réponses ni votes, inutile de relire la base (comment.id est lu avant le commit).
+    comment_dict = {
+        "id": comment.id,
+        "content": content,
+        "created_at": now.isoformat(),
+        "updated_at": now.isoformat(),
+        "is_moderated": False,
+        "user_id": user_id,
+        "user": {"id": user_id, "username": username, "avatar": avatar},
+        "post_id": post_id,
+        "parent_comment_id": parent_comment_id,
+        "likes": 0,
+        "dislikes": 0,
+        "children": [],
+        "reply_count": 0,
+        "has_more_replies": False,
+    }
     db.session.commit()
 
-    if post.author_id != user_id:
-        notif = Notification(
-            recipient_id=post.author_id,
-            message=f"Nouveau commentaire sur votre post : {post.title}"
-        )
-        db.session.add(notif)
-        db.session.commit()
-
     return jsonify({
         "message": "Commentaire créé avec succès",
-        "comment": comment.to_dict()
+        "comment": comment_dict
     }), 201
 
 
-
 @comment_bp.route('/<int:comment_id>', methods=['GET'])
 @cross_origin()
 def get_comment(comment_id):
-    comment = Comment.query.get(comment_id)
+    comment = Comment.query.options(*loading.profile('comment_thread', depth=COMMENT_MAX_DEPTH)).get(comment_id)
     if not comment:
         return jsonify({"error": "Commentaire non trouvé"}), 404
     return jsonify(comment.to_dict()), 200
@@ -118,8 +182,7 @@ def delete_comment(comment_id):
     if comment.user_id != user_id and (not user or user.role != 'admin'):
         return jsonify({"error": "Accès refusé"}), 403
 
-    db.session.delete(comment)
-    db.session.commit()
+    delete_comment_tree(comment.id, comment.post_id)
     return jsonify({"message": "Commentaire supprimé"}), 200
 
 
@@ -130,19 +193,51 @@ def list_comments(post_id):
     if not post:
         return jsonify({"error": "Post non trouvé"}), 404
 
-    parent_comments = Comment.query.filter_by(post_id=post_id, parent_comment_id=None)\
-        .order_by(Comment.created_at.desc()).all()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', COMMENTS_PER_PAGE, type=int), 1), MAX_PER_PAGE)
+    depth = _requested_depth()
 
-    def recursive_count(comments):
-        total = 0
-        for c in comments:
-            total += 1
-            total += recursive_count(c.children)
-        return total
+    parent_comments, has_more = top_level_page(db.session, post_id, page, per_page, depth)
 
-    total_comments = recursive_count(parent_comments)
-    comments_dict = [comment.to_dict() for comment in parent_comments]
+    total_comments = db.session.query(func.count(Comment.id)).filter(Comment.post_id == post_id).scalar()
+    comments_dict = [comment.to_dict(depth) for comment in parent_comments]
     return jsonify({
         "comments": comments_dict,
         "total": total_comments,
+        "page": page,
+        "per_page": per_page,
+        "has_more": has_more,
+    }), 200
+
+
+@comment_bp.route('/<int:comment_id>/replies', methods=['GET'])
+@cross_origin()
+def list_replies(comment_id):
+    if not db.session.query(Comment.id).filter_by(id=comment_id).first():
+        return jsonify({"error": "Commentaire non trouvé"}), 404
+
+    limit = min(max(request.args.get('limit', COMMENTS_PER_PAGE, type=int), 1), MAX_PER_PAGE)
+    depth = _requested_depth()
+
+    # pagination par curseur (created_at, id) : s'appuie sur l'index (parent_comment_id, created_at)
+    query = Comment.query.options(*loading.profile('comment_thread', depth=depth))\
+        .filter(Comment.parent_comment_id == comment_id)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            created_at, last_id = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({"error": "Curseur invalide"}), 400
+        query = query.filter(or_(
+            Comment.created_at > created_at,
+            and_(Comment.created_at == created_at, Comment.id > last_id),
+        ))
+    replies = query.order_by(Comment.created_at, Comment.id).limit(limit + 1).all()
+    has_more = len(replies) > limit
+    replies = replies[:limit]
+
+    return jsonify({
+        "replies": [reply.to_dict(depth) for reply in replies],
+        "next_cursor": encode_cursor(replies[-1]) if has_more else None,
+        "has_more": has_more,
     }), 200
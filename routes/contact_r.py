@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
-from flask_mail import Message
 from flask_cors import cross_origin  
-from app import mail
+from extensions import mail
+from services import metrics
 import re
 import os
 
@@ -22,6 +22,7 @@ def send_contact_email():
         return jsonify({"error": "Email invalide"}), 400
 
     try:
+        from flask_mail import Message
         msg = Message(
             subject=f"Message de contact : {data['subject']}",
             sender=data['email'],
@@ -32,7 +33,8 @@ def send_contact_email():
                 f"Message :\n{data['message']}"
             )
         )
-        mail.send(msg)
+        with metrics.track_outbound('smtp'):
+            mail.send(msg)
         return jsonify({"message": "Email envoyé avec succès"}), 200
     except Exception as e:
         return jsonify({"error": f"Erreur lors de l'envoi de l'email : {str(e)}"}), 500
@@ -1,19 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-from app import db
-from models.like import Like
-from models.post import Post
-from models.comment import Comment
+from extensions import db
+from services import ranking
+from services.votes import cast_vote, post_created_at, retract_vote, vote_summary
 
 like_bp = Blueprint('like_bp', __name__, url_prefix='/api/likes')
 
-def check_existence(content_type, content_id):
-    if content_type == 'post':
-        return Post.query.get(content_id)
-    elif content_type == 'comment':
-        return Comment.query.get(content_id)
-    return None
-
 @like_bp.route('/<string:content_type>/<int:content_id>', methods=['POST'])
 @cross_origin()
 def like_or_dislike(content_type, content_id):
@@ -30,25 +22,20 @@ def like_or_dislike(content_type, content_id):
     if is_like is None or not isinstance(is_like, bool):
         return jsonify({"error": "Le champ 'is_like' (bool) est requis"}), 400
 
-    if not check_existence(content_type, content_id):
+    vote = cast_vote(user_id, content_type, content_id, is_like)
+    if vote is None:
+        db.session.rollback()
         return jsonify({"error": f"{content_type.capitalize()} non trouvé"}), 404
+    if content_type == 'post':
+        ranking.bump_votes(content_id, vote["created_at"], *vote["delta"])
+    db.session.commit()
 
-    existing = Like.query.filter_by(user_id=user_id, content_type=content_type, content_id=content_id).first()
-
-    if existing:
-        if existing.is_like == is_like:
-            db.session.delete(existing)
-            db.session.commit()
-            return jsonify({"message": f"{content_type.capitalize()} { 'like' if is_like else 'dislike' } supprimé"}), 200
-        else:
-            existing.is_like = is_like
-            db.session.commit()
-            return jsonify({"message": f"{content_type.capitalize()} changé en { 'like' if is_like else 'dislike' }"}), 200
-    else:
-        new_like = Like(user_id=user_id, content_type=content_type, content_id=content_id, is_like=is_like)
-        db.session.add(new_like)
-        db.session.commit()
-        return jsonify({"message": f"{content_type.capitalize()} { 'liké' if is_like else 'disliké' }"}), 201
+    summary = vote["summary"]
+    if vote["outcome"] == 'removed':
+        return jsonify({"message": f"{content_type.capitalize()} { 'like' if is_like else 'dislike' } supprimé", **summary}), 200
+    if vote["outcome"] == 'switched':
+        return jsonify({"message": f"{content_type.capitalize()} changé en { 'like' if is_like else 'dislike' }", **summary}), 200
+    return jsonify({"message": f"{content_type.capitalize()} { 'liké' if is_like else 'disliké' }", **summary}), 201
 
 @like_bp.route('/<string:content_type>/<int:content_id>', methods=['DELETE'])
 @cross_origin()
@@ -57,11 +44,11 @@ def delete_like(content_type, content_id):
     if not user_id:
         return jsonify({"error": "user_id requis"}), 400
 
-    like = Like.query.filter_by(user_id=user_id, content_type=content_type, content_id=content_id).first()
-    if not like:
+    delta = retract_vote(user_id, content_type, content_id)
+    if delta is None:
         return jsonify({"error": "Interaction non trouvée"}), 404
-
-    db.session.delete(like)
+    if content_type == 'post':
+        ranking.bump_votes(content_id, post_created_at(content_id), *delta)
     db.session.commit()
     return jsonify({"message": "Interaction supprimée"}), 200
 
@@ -72,17 +59,4 @@ def get_likes_info(content_type, content_id):
     if content_type not in ['post', 'comment']:
         return jsonify({"error": "Type de contenu invalide"}), 400
 
-    likes_count = Like.query.filter_by(content_type=content_type, content_id=content_id, is_like=True).count()
-    dislikes_count = Like.query.filter_by(content_type=content_type, content_id=content_id, is_like=False).count()
-
-    user_vote = None
-    if user_id:
-        like = Like.query.filter_by(user_id=user_id, content_type=content_type, content_id=content_id).first()
-        if like:
-            user_vote = 1 if like.is_like else -1
-
-    return jsonify({
-        "likes": likes_count,
-        "dislikes": dislikes_count,
-        "user_vote": user_vote
-    }), 200
+    return jsonify(vote_summary(content_type, content_id, user_id)), 200
@@ -0,0 +1,17 @@
+from flask import Blueprint, Response, jsonify, request
+import hmac
+import os
+from services import metrics
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    if METRICS_TOKEN:
+        auth = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(auth, f"Bearer {METRICS_TOKEN}"):
+            return jsonify({"error": "Accès refusé"}), 403
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
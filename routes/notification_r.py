@@ -1,8 +1,9 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app import db
+from extensions import db
 from models.notification import Notification
 from models.user import User
+from services import notification_retention
 
 notification_bp = Blueprint('notification', __name__, url_prefix='/api/notifications')
 
@@ -10,7 +11,7 @@ notification_bp = Blueprint('notification', __name__, url_prefix='/api/notificat
 @jwt_required()
 def get_notifications():
     current_user_id = get_jwt_identity()
-    notifications = Notification.query.filter_by(recipient_id=current_user_id).order_by(Notification.created_at.desc()).all()
+    notifications = Notification.query.filter_by(recipient_id=current_user_id).order_by(Notification.updated_at.desc()).all()
     return jsonify([n.to_dict() for n in notifications]), 200
 
 @notification_bp.route('/<int:notif_id>/read', methods=['POST'])
@@ -52,3 +53,11 @@ def get_unread_notifications_count():
     count = Notification.query.filter_by(recipient_id=current_user_id, is_read=False).count()
     return jsonify({"unread_count": count}), 200
 
+@notification_bp.route('/admin/retention', methods=['GET'])
+@jwt_required()
+def retention_dry_run():
+    current_user_id = get_jwt_identity()
+    user_admin = User.query.get(current_user_id)
+    if not user_admin or user_admin.role != 'admin':
+        return jsonify({"error": "Accès refusé"}), 403
+    return jsonify(notification_retention.report()), 200
@@ -1,14 +1,15 @@
 from datetime import datetime
-import cloudinary
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_cors import cross_origin 
-from app import db
-from models.like import Like
-from models.notification import Notification
+from extensions import db
+from services import idempotency, loading, media_store, notifications, ranking
+from services.deletion import delete_post_tree
+from services.storage import InvalidUpload, confirm_refs
+from services.votes import cast_vote, post_created_at, retract_vote
+from models.comment import COMMENT_MAX_DEPTH
 from models.post import Post
 from models.user import User
-import os
-import uuid
+from routes.comment_r import COMMENTS_PER_PAGE, top_level_page
 
 post_bp = Blueprint('post_bp', __name__, url_prefix='/api/posts')
 
@@ -23,6 +24,7 @@ def is_admin(user_id):
 
 @post_bp.route('', methods=['POST'])
 @cross_origin()
+@idempotency.idempotent('create_post')
 def create_post():
     user_id = request.form.get('author_id')
     if not user_id or not is_admin(user_id):
@@ -33,23 +35,13 @@ def create_post():
     if not title or not content:
         return jsonify({"error": "Titre et contenu sont obligatoires"}), 400
 
-    medias = []
+    try:
+        medias = confirm_refs('post', request.form.get('media_refs'))
+    except InvalidUpload as e:
+        return jsonify({"error": str(e)}), 400
     for file in request.files.getlist('media'):
         if file and allowed_file(file.filename):
-            ext = file.filename.rsplit('.', 1)[1].lower()
-            result = cloudinary.uploader.upload(
-                file,
-                folder="posts_aeedk",
-                public_id=f"{uuid.uuid4()}_post",
-                resource_type="video" if ext in {'mp4', 'webm'} else "image"
-            )
-            media_url = result["secure_url"]
-            media_type = 'video' if ext in {'mp4', 'webm'} else 'image'
-            medias.append({
-                "url": media_url,
-                "filename": result.get("original_filename") + '.' + ext,
-                "type": media_type,
-            })
+            medias.append(media_store.put('post', file))
 
     post = Post(
         title=title,
@@ -61,16 +53,12 @@ def create_post():
         created_at=datetime.utcnow()
     )
     db.session.add(post)
+    media_store.retain(media_store.media_urls(medias))
     db.session.commit()
+    ranking.add_post(post)
 
     # Création notification pour tous les utilisateurs sauf auteur
-    users = User.query.filter(User.id != int(user_id)).all()
-    for user in users:
-        notif = Notification(
-            recipient_id=user.id,
-            message=f"Nouveau post publié : {post.title}"
-        )
-        db.session.add(notif)
+    notifications.notify_all_users('new_post', post.id, int(user_id), post.title)
     db.session.commit()
 
     return jsonify({
@@ -82,20 +70,31 @@ def create_post():
 @cross_origin()
 def get_posts():
     try:
-        posts = Post.query.order_by(Post.created_at.desc()).all()
+        if request.args.get('sort') == 'trending':
+            query = ranking.trending_query()
+        else:
+            query = Post.query.order_by(Post.created_at.desc())
+        query = query.options(*loading.profile('feed'))
+        per_page = request.args.get('per_page', type=int)
+        if per_page:
+            page = max(request.args.get('page', 1, type=int), 1)
+            query = query.offset((page - 1) * per_page).limit(per_page)
+        posts = query.all()
         return jsonify([post.to_dict() for post in posts]), 200
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return jsonify({"error": "Erreur serveur", "details": str(e)}), 500
+    except Exception:
+        current_app.logger.exception("Erreur lors du chargement des posts")
+        return jsonify({"error": "Erreur serveur"}), 500
 
 @post_bp.route('/<int:post_id>', methods=['GET'])
 @cross_origin()
 def get_post(post_id):
-    post = Post.query.get(post_id)
+    depth = min(max(request.args.get('depth', COMMENT_MAX_DEPTH, type=int), 0), COMMENT_MAX_DEPTH)
+    post = Post.query.options(*loading.profile('post_detail')).get(post_id)
     if not post:
         return jsonify({"error": "Post non trouvé"}), 404
-    return jsonify(post.to_dict(include_comments=True)), 200
+    # première page des commentaires racine seulement : la suite via /api/comments/post/<id>?page=2
+    comments, has_more = top_level_page(db.session, post_id, 1, COMMENTS_PER_PAGE, depth)
+    return jsonify(post.to_dict(comments=comments, comment_depth=depth, comments_has_more=has_more)), 200
 
 @post_bp.route('/<int:post_id>', methods=['PUT'])
 @cross_origin()
@@ -109,6 +108,7 @@ def update_post(post_id):
     post = Post.query.get(post_id)
     if not post:
         return jsonify({"error": "Post non trouvé"}), 404
+    old_media_urls = media_store.media_urls(post.media)
 
     if request.content_type and 'multipart/form-data' in request.content_type:
         form = request.form
@@ -116,23 +116,13 @@ def update_post(post_id):
         post.content = form.get('content', post.content)
         post.is_featured = form.get('is_featured', str(post.is_featured)).lower() == 'true'
         post.status = form.get('status', post.status)
-        medias = []
+        try:
+            medias = confirm_refs('post', form.get('media_refs'))
+        except InvalidUpload as e:
+            return jsonify({"error": str(e)}), 400
         for file in request.files.getlist('media'):
             if file and allowed_file(file.filename):
-                ext = file.filename.rsplit('.', 1)[1].lower()
-                result = cloudinary.uploader.upload(
-                    file,
-                    folder="posts_aeedk",
-                    public_id=f"{uuid.uuid4()}_post",
-                    resource_type="video" if ext in {'mp4', 'webm'} else "image"
-                )
-                media_url = result["secure_url"]
-                media_type = 'video' if ext in {'mp4', 'webm'} else 'image'
-                medias.append({
-                    "url": media_url,
-                    "filename": result.get("original_filename") + '.' + ext,
-                    "type": media_type,
-                })
+                medias.append(media_store.put('post', file))
         if medias:
             post.media = medias
     else:
@@ -140,8 +130,16 @@ def update_post(post_id):
         for field in ['title', 'content', 'is_featured', 'status']:
             if data and field in data:
                 setattr(post, field, data[field])
+        if data and data.get('media_refs'):
+            try:
+                post.media = confirm_refs('post', data['media_refs'])
+            except InvalidUpload as e:
+                return jsonify({"error": str(e)}), 400
 
     post.updated_at = datetime.utcnow()
+    if media_store.media_urls(post.media) != old_media_urls:
+        media_store.swap(old_media_urls, media_store.media_urls(post.media))
+    ranking.pin_post(post.id, post.is_featured)
     db.session.commit()
     return jsonify({"message": "Post mis à jour", "post": post.to_dict()}), 200
 
@@ -154,29 +152,26 @@ def delete_post(post_id):
     if not is_admin(user_id):
         return jsonify({"error": "Accès refusé, vous devez être admin"}), 403
 
-    post = Post.query.get(post_id)
-    if not post:
+    if not delete_post_tree(post_id):
         return jsonify({"error": "Post non trouvé"}), 404
-
-    db.session.delete(post)
-    db.session.commit()
     return jsonify({"message": "Post supprimé"}), 200
 
 @post_bp.route('/<int:post_id>/like', methods=['POST'])
 @cross_origin()
 def like_post(post_id):
-    user_id = request.json.get('user_id')
+    user_id = (request.json or {}).get('user_id')
     if not user_id:
         return jsonify({"error": "user_id manquant"}), 400
-    post = Post.query.get_or_404(post_id)
-    existing_like = Like.query.filter_by(user_id=user_id, content_type='post', content_id=post_id).first()
-    if existing_like:
-        return jsonify({"message": "Post déjà liké"}), 400
-
-    like = Like(user_id=user_id, content_type='post', content_id=post_id)
-    db.session.add(like)
+    vote = cast_vote(user_id, 'post', post_id, True, toggle=False)
+    if vote is None:
+        db.session.rollback()
+        return jsonify({"error": "Post non trouvé"}), 404
+    ranking.bump_votes(post_id, vote["created_at"], *vote["delta"])
     db.session.commit()
-    return jsonify({"message": "Post liké"}), 201
+    if vote["outcome"] == 'unchanged':
+        # idempotent : un nouvel appel renvoie l'état courant sans compter un second like
+        return jsonify({"message": "Post déjà liké", **vote["summary"]}), 200
+    return jsonify({"message": "Post liké", **vote["summary"]}), 201
 
 @post_bp.route('/<int:post_id>/like', methods=['DELETE'])
 @cross_origin()
@@ -184,9 +179,9 @@ def unlike_post(post_id):
     user_id = request.args.get('user_id') or (request.json and request.json.get('user_id'))
     if not user_id:
         return jsonify({"error": "user_id manquant"}), 400
-    like = Like.query.filter_by(user_id=user_id, content_type='post', content_id=post_id).first()
-    if not like:
+    delta = retract_vote(user_id, 'post', post_id)
+    if delta is None:
         return jsonify({"message": "Like non trouvé"}), 404
-    db.session.delete(like)
+    ranking.bump_votes(post_id, post_created_at(post_id), *delta)
     db.session.commit()
     return jsonify({"message": "Like supprimé"}), 200
@@ -0,0 +1,20 @@
+from flask import Blueprint, jsonify, request
+from flask_cors import cross_origin
+from services import sync
+
+sync_bp = Blueprint('sync', __name__, url_prefix='/api/sync')
+
+@sync_bp.route('', methods=['GET'])
+@cross_origin()
+def get_changes():
+    token = request.args.get('since')
+    if not token:
+        return jsonify({"reset": True, "token": sync.initial_token()}), 200
+    try:
+        since = sync.decode_token(token)
+    except sync.ExpiredToken:
+        # jeton trop ancien : le client doit recharger le fil complet
+        return jsonify({"reset": True, "token": sync.initial_token()}), 200
+    except ValueError:
+        return jsonify({"error": "Jeton de synchronisation invalide"}), 400
+    return jsonify({"reset": False, **sync.changes(since)}), 200
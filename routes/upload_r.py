@@ -0,0 +1,43 @@
+from flask import Blueprint, jsonify, request
+from flask_cors import cross_origin
+from extensions import db
+from models.user import User
+from services.storage import UPLOAD_KINDS, InvalidUpload, get_storage
+
+upload_bp = Blueprint('upload_bp', __name__, url_prefix='/api/uploads')
+
+@upload_bp.route('/sign', methods=['POST'])
+@cross_origin()
+def sign_upload():
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind')
+    if kind not in UPLOAD_KINDS:
+        return jsonify({"error": "Type d'upload invalide"}), 400
+    if kind == 'post':
+        # mêmes règles que create_post : seuls les admins publient des médias de post
+        author = User.query.get(data.get('author_id')) if data.get('author_id') else None
+        if not author or author.role != 'admin':
+            return jsonify({"error": "Accès non autorisé"}), 403
+    try:
+        return jsonify(get_storage().sign_upload(kind, data.get('filename'))), 200
+    except InvalidUpload as e:
+        return jsonify({"error": str(e)}), 400
+
+@upload_bp.route('/local/<path:key>', methods=['PUT'])
+@cross_origin()
+def local_upload(key):
+    storage = get_storage()
+    if storage.name != 'local':
+        return jsonify({"error": "Backend d'upload local désactivé"}), 404
+    expires = request.args.get('expires', type=int)
+    try:
+        max_bytes = storage.check_upload(key, expires, request.args.get('signature'))
+        # la limite globale MAX_CONTENT_LENGTH ne s'applique pas aux uploads signés
+        request.max_content_length = max_bytes
+        stored = storage.store(key, expires, request.stream, max_bytes)
+        db.session.commit()
+        return jsonify(stored), 201
+    except InvalidUpload as e:
+        # upload refusé : la signature n'est pas consommée
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
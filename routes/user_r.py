@@ -2,15 +2,16 @@ from datetime import datetime, timedelta
 from flask import Blueprint, jsonify, request, url_for, redirect
 from flask_cors import cross_origin
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token, verify_jwt_in_request
-from flask_mail import Message
-from app import db, mail
+from extensions import db, mail
+from services import idempotency, loading, media_store, metrics, passwords
+from services.db_routing import use_primary
+from services.deletion import delete_user_tree, delete_user_tree_in_background
+from services.storage import InvalidUpload, confirm_refs
 from models.user import User
 import os
 import uuid
 import re
 from sqlalchemy import or_
-import cloudinary
-import cloudinary.uploader
 
 FRONTEND_URL = os.getenv("FRONTEND_URL", "https://aeedk-frontend.onrender.com")
 user_bp = Blueprint('user', __name__, url_prefix='/api/user')
@@ -24,6 +25,7 @@ def allowed_file(filename):
 
 @user_bp.route('/register', methods=['POST'])
 @cross_origin(origin=FRONTEND_URL, supports_credentials=True)
+@idempotency.idempotent('register')
 def register():
     data = request.form.to_dict() if request.form else (request.get_json() or {})
     required_fields = [
@@ -42,7 +44,12 @@ def register():
         return jsonify({"error": "Format de birth_date invalide, attendu YYYY-MM-DD"}), 400
 
     avatar_url = ""
-    if 'avatar' in request.files:
+    if data.get('avatar_ref'):
+        try:
+            avatar_url = confirm_refs('avatar', data['avatar_ref'])[0]["url"]
+        except InvalidUpload as e:
+            return jsonify({"error": str(e)}), 400
+    elif 'avatar' in request.files:
         file = request.files['avatar']
         if file and allowed_file(file.filename):
             file.seek(0, os.SEEK_END)
@@ -50,14 +57,7 @@ def register():
             file.seek(0)
             if file_size > MAX_AVATAR_SIZE:
                 return jsonify({"error": "Avatar trop volumineux (max 2 Mo)"}), 413
-            result = cloudinary.uploader.upload(
-                file,
-                folder="avatars_aeedk",
-                public_id=f"{uuid.uuid4()}_avatar",
-                overwrite=True,
-                resource_type="image"
-            )
-            avatar_url = result["secure_url"]
+            avatar_url = media_store.put('avatar', file)["url"]
         else:
             return jsonify({"error": "Format d'avatar non autorisé"}), 400
 
@@ -76,12 +76,14 @@ def register():
     )
     user.set_password(data['password'])
     db.session.add(user)
+    media_store.retain([avatar_url])
     db.session.commit()
     verify_url = url_for('user.verify_email', token=user.confirmation_token, _external=True)
     sender = str(os.getenv('MAIL_USERNAME'))
     if not sender or not isinstance(sender, str):
         return jsonify({"error": "Configuration email invalide (MAIL_USERNAME manquant)"}), 500
     recipient = str(user.email)
+    from flask_mail import Message
     msg = Message(
         subject="Confirmation de votre inscription",
         sender=sender,
@@ -90,7 +92,8 @@ def register():
     msg.body = f"Cliquez sur le lien suivant pour confirmer votre compte : {verify_url}"
     msg.html = f'<p>Merci pour votre inscription.</p><p><a href="{verify_url}">Confirmez votre adresse email</a></p>'
     try:
-        mail.send(msg)
+        with metrics.track_outbound('smtp'):
+            mail.send(msg)
         return jsonify({"message": "Inscription réussie. Vérifiez votre email."}), 201
     except Exception as e:
         return jsonify({"error": "Erreur lors de l'envoi de l'email", "details": str(e)}), 500
@@ -106,12 +109,17 @@ def login():
     user = User.query.filter((User.email == identifier) | (User.username == identifier)).first()
     if not user or not user.check_password(password):
         return jsonify({"error": "Identifiants invalides"}), 401
+    if passwords.needs_rehash(user.password_hash):
+        # paramètres de hachage modifiés depuis le dernier enregistrement du mot de passe
+        user.set_password(password)
+        db.session.commit()
     if not user.confirmed:
         return jsonify({"error": "Veuillez confirmer votre email."}), 403
     token = create_access_token(identity=str(user.id))
     return jsonify({"token": token, "user": user.to_dict()}), 200
 
 @user_bp.route('/verify/<token>', methods=['GET'])
+@use_primary
 def verify_email(token):
     user = User.query.filter_by(confirmation_token=token).first()
     if not user:
@@ -140,6 +148,7 @@ def forgot_password():
     if not sender or not isinstance(sender, str):
         return jsonify({"error": "Configuration email invalide (MAIL_USERNAME manquant)"}), 500
     recipient = str(email)
+    from flask_mail import Message
     msg = Message(
         subject="Réinitialisation du mot de passe",
         sender=sender,
@@ -148,12 +157,14 @@ def forgot_password():
     msg.body = f"Cliquez ici pour réinitialiser votre mot de passe : {reset_url}"
     msg.html = f'<p><a href="{reset_url}">Réinitialisez votre mot de passe</a></p>'
     try:
-        mail.send(msg)
+        with metrics.track_outbound('smtp'):
+            mail.send(msg)
         return jsonify({"message": "Email de réinitialisation envoyé"})
     except Exception as e:
         return jsonify({"error": "Erreur lors de l'envoi de l'email", "details": str(e)}), 500
 
 @user_bp.route('/reset-password/<token>', methods=['GET'])
+@use_primary
 def reset_password_get(token):
     user = User.query.filter_by(reset_token=token).first()
     if not user or user.reset_token_expiration < datetime.utcnow():
@@ -197,6 +208,7 @@ def update_user(user_id):
     user = User.query.get(user_id)
     if not user:
         return jsonify({"error": "Utilisateur non trouvé"}), 404
+    old_avatar = user.avatar
     try:
         data = {}
         if request.content_type and 'multipart/form-data' in request.content_type:
@@ -211,20 +223,18 @@ def update_user(user_id):
                     avatar.seek(0)
                     if file_size > MAX_AVATAR_SIZE:
                         return jsonify({"error": "Avatar trop volumineux (max 2 Mo)"}), 413
-                    result = cloudinary.uploader.upload(
-                        avatar,
-                        folder="avatars_aeedk",
-                        public_id=f"{uuid.uuid4()}_avatar",
-                        overwrite=True,
-                        resource_type="image"
-                    )
-                    user.avatar = result["secure_url"]
+                    user.avatar = media_store.put('avatar', avatar)["url"]
                 elif avatar and avatar.filename:
                     return jsonify({"error": "Format d'avatar non autorisé"}), 400
         else:
             data = request.get_json(silent=True) or {}
             if "sous-préfecture" in data and "sub_prefecture" not in data:
                 data["sub_prefecture"] = data.pop("sous-préfecture")
+        if data.get('avatar_ref'):
+            try:
+                user.avatar = confirm_refs('avatar', data['avatar_ref'])[0]["url"]
+            except InvalidUpload as e:
+                return jsonify({"error": str(e)}), 400
         fields = [
             'username', 'first_name', 'last_name',
             'sub_prefecture', 'village', 'phone'
@@ -246,6 +256,8 @@ def update_user(user_id):
                     user.birth_date = datetime.strptime(raw.strip(), "%Y-%m-%d").date()
                 except ValueError:
                     return jsonify({"error": "Format de date invalide (YYYY-MM-DD)"}), 422
+        if user.avatar != old_avatar:
+            media_store.swap([old_avatar], [user.avatar])
         db.session.commit()
         return jsonify({"message": "Profil mis à jour", "user": user.to_dict()}), 200
     except Exception as e:
@@ -259,7 +271,7 @@ def admin_get_all_users():
     user_admin = User.query.get(current_user_id)
     if not user_admin or user_admin.role != 'admin':
         return jsonify({"error": "Accès refusé"}), 403
-    users = User.query.all()
+    users = User.query.options(*loading.profile('admin_users')).all()
     out = []
     for u in users:
         try:
@@ -282,9 +294,12 @@ def admin_update_user(user_id):
     if not user:
         return jsonify({"error": "Utilisateur non trouvé"}), 404
     data = request.get_json(silent=True) or {}
+    old_avatar = user.avatar
     for field in ['username', 'email', 'first_name', 'last_name', 'role', 'confirmed', 'sub_prefecture', 'village', 'avatar']:
         if field in data:
             setattr(user, field, data[field])
+    if user.avatar != old_avatar:
+        media_store.swap([old_avatar], [user.avatar])
     db.session.commit()
     return jsonify({"message": "Utilisateur mis à jour", "user": user.to_dict()}), 200
 
@@ -295,11 +310,13 @@ def admin_delete_user(user_id):
     user_admin = User.query.get(current_user_id)
     if not user_admin or user_admin.role != 'admin':
         return jsonify({"error": "Accès refusé"}), 403
-    user = User.query.get(user_id)
-    if not user:
+    if request.args.get('background', 'false').lower() == 'true':
+        if not db.session.query(User.id).filter_by(id=user_id).first():
+            return jsonify({"error": "Utilisateur non trouvé"}), 404
+        delete_user_tree_in_background(user_id)
+        return jsonify({"message": "Suppression de l'utilisateur en cours"}), 202
+    if not delete_user_tree(user_id):
         return jsonify({"error": "Utilisateur non trouvé"}), 404
-    db.session.delete(user)
-    db.session.commit()
     return jsonify({"message": "Utilisateur supprimé"}), 200
 
 @user_bp.before_request
@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# Débit de hachage des mots de passe par cœur, pour choisir PASSWORD_HASH_METHOD / PASSWORD_HASH_COST
+# et dimensionner PASSWORD_HASH_WORKERS : un cœur occupé à hacher ne sert plus de requêtes.
+#
+#   python scripts/bench_passwords.py
+#   python scripts/bench_passwords.py --cases pbkdf2:600000,scrypt:32768,bcrypt:12 --duration 5
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services.passwords import compute_check, compute_hash  # noqa: E402
+
+DEFAULT_CASES = 'pbkdf2:600000,pbkdf2:1000000,scrypt:16384,scrypt:32768,bcrypt:10,bcrypt:12'
+PASSWORD = 'correct horse battery staple'
+
+
+def _hash_loop(method, cost, duration):
+    # exécuté dans chaque process : nombre de hachages réalisés pendant la durée donnée
+    count = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        compute_hash(method, cost, PASSWORD)
+        count += 1
+    return count
+
+
+def bench_case(method, cost, processes, duration):
+    stored = compute_hash(method, cost, PASSWORD)
+    start = time.perf_counter()
+    assert compute_check(stored, PASSWORD)
+    check_ms = (time.perf_counter() - start) * 1000
+
+    single = _hash_loop(method, cost, duration) / duration
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context('spawn')) as pool:
+        # premier appel : démarrage des process, exclu de la mesure
+        list(pool.map(compute_hash, [method] * processes, [cost] * processes, [PASSWORD] * processes))
+        counts = list(pool.map(_hash_loop, [method] * processes, [cost] * processes, [duration] * processes))
+    total = sum(counts) / duration
+    return {
+        'case': f"{method}:{cost}",
+        'check_ms': check_ms,
+        'single': single,
+        'total': total,
+        'per_core': total / processes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit de hachage des mots de passe")
+    parser.add_argument('--cases', default=DEFAULT_CASES, help="liste méthode:coût séparée par des virgules")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--duration', type=float, default=3, help="secondes de mesure par cas")
+    args = parser.parse_args()
+
+    print(f"{args.processes} process, {args.duration:g} s par mesure")
+    print(f"{'cas':<18}{'vérif. (ms)':>12}{'1 process/s':>14}{'total/s':>10}{'par cœur/s':>12}")
+    for case in filter(None, (part.strip() for part in args.cases.split(','))):
+        method, _, cost = case.partition(':')
+        try:
+            row = bench_case(method, int(cost), args.processes, args.duration)
+        except ImportError as exc:
+            print(f"{case:<18}indisponible ({exc.name} non installé)")
+            continue
+        print(f"{row['case']:<18}{row['check_ms']:>12.1f}{row['single']:>14.1f}{row['total']:>10.1f}{row['per_core']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
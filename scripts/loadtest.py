@@ -0,0 +1,408 @@
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+# Test de charge en boucle fermée : N membres virtuels enchaînent des actions tirées selon
+# un mélange pondéré, contre l'app lancée par gunicorn (wsgi:app) sur une base locale peuplée.
+# Cloudinary est remplacé par le stockage local (UPLOAD_BACKEND=local) et SMTP par un puits local.
+#
+#   python scripts/loadtest.py seed
+#   python scripts/loadtest.py run --workers 2 --users 16 --duration 30
+#   python scripts/loadtest.py sweep --workers 1,2,4,8 --users 32
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'aeedk_loadtest.db')}"
+PASSWORD = 'loadtest'
+DEFAULT_MIX = 'feed=40,post=25,vote=12,comment=8,notifications=12,login=3'
+
+
+def seed(args):
+    if not args.database_url.startswith('sqlite') and not args.yes:
+        sys.exit("Base non SQLite : relancer avec --yes pour confirmer l'insertion des données de test")
+    if args.database_url.startswith('sqlite:///'):
+        path = args.database_url[len('sqlite:///'):]
+        if os.path.exists(path):
+            os.remove(path)
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+    sys.path.insert(0, ROOT)
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert, select
+    from app import create_app
+    from extensions import db
+    from models.comment import Comment
+    from models.like import Like
+    from models.post import Post
+    from models.user import User
+    from services import ranking
+
+    rng = random.Random(args.rng_seed)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        # un seul hachage pbkdf2 pour tous les comptes : le peuplement reste rapide
+        hasher = User(username='_', email='_')
+        hasher.set_password(PASSWORD)
+        now = datetime.utcnow()
+        db.session.execute(insert(User), [{
+            "username": f"lt_user{i}", "email": f"lt_user{i}@example.com", "password_hash": hasher.password_hash,
+            "first_name": "Load", "last_name": f"Test{i}", "role": 'admin' if i == 0 else 'membre',
+            "confirmed": True, "avatar": "", "created_at": now, "last_active": now,
+        } for i in range(args.users)])
+        user_ids = list(db.session.scalars(select(User.id).order_by(User.id)))
+        db.session.execute(insert(Post), [{
+            "title": f"Post de charge {i}", "content": "Lorem ipsum " * rng.randint(5, 80),
+            "author_id": user_ids[0], "created_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 14)),
+            "updated_at": now, "status": 'published', "views": rng.randint(0, 500), "is_featured": i < 2,
+        } for i in range(args.posts)])
+        post_ids = list(db.session.scalars(select(Post.id)))
+        db.session.execute(insert(Comment), [{
+            "content": "Commentaire " * rng.randint(1, 20), "user_id": rng.choice(user_ids), "post_id": post_id,
+            "created_at": now, "updated_at": now, "is_moderated": False,
+        } for post_id in post_ids for _ in range(rng.randint(0, args.comments * 2))])
+        votes = {(rng.choice(user_ids), rng.choice(post_ids)) for _ in range(args.posts * args.votes)}
+        db.session.execute(insert(Like), [{
+            "user_id": user_id, "content_type": 'post', "content_id": post_id, "is_like": rng.random() < 0.8,
+            "created_at": now, "updated_at": now,
+        } for user_id, post_id in votes])
+        db.session.commit()
+        ranking.refresh_all()
+    print(f"{args.users} utilisateurs, {args.posts} posts, {len(votes)} votes dans {args.database_url}")
+
+
+class SmtpSink(socketserver.StreamRequestHandler):
+    # accepte tout et ne délivre rien : suffisant pour flask_mail sans TLS ni authentification
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 loadtest ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith('DATA'):
+                self.reply("354 fin par <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                self.server.messages += 1
+                self.reply("250 accepté")
+            elif command.startswith('QUIT'):
+                self.reply("221 au revoir")
+                return
+            else:
+                self.reply("250 ok")
+
+
+def start_smtp_sink():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SmtpSink)
+    server.daemon_threads = True
+    server.messages = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_server(args, workers, port, smtp_port):
+    metrics_dir = tempfile.mkdtemp(prefix='aeedk_loadtest_metrics_')
+    env = dict(
+        os.environ,
+        DATABASE_URL=args.database_url,
+        UPLOAD_BACKEND='local',
+        MAIL_SERVER='127.0.0.1',
+        MAIL_PORT=str(smtp_port),
+        MAIL_USE_TLS='False',
+        MAIL_USERNAME='loadtest@example.com',
+        MAIL_PASSWORD='',
+        PROMETHEUS_MULTIPROC_DIR=metrics_dir,
+        GUNICORN_THREADS=str(args.threads),
+        PROFILE_SAMPLE_RATE='0',
+        ADMISSION_ENABLED='True' if args.admission else 'False',
+        # chaque membre virtuel envoie sa propre IP dans X-Forwarded-For
+        ADMISSION_PROXY_HOPS='1',
+    )
+    env.pop('DATABASE_REPLICA_URL', None)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'wsgi:app', '-c', 'gunicorn.conf.py',
+         '--workers', str(workers), '--threads', str(args.threads), '--bind', f"127.0.0.1:{port}",
+         '--log-level', 'warning'],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit("gunicorn s'est arrêté au démarrage")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/posts?per_page=1')
+            if conn.getresponse().status == 200:
+                return process, metrics_dir
+        except OSError:
+            pass
+        time.sleep(0.2)
+    stop_server(process, metrics_dir)
+    sys.exit("gunicorn ne répond pas")
+
+
+def stop_server(process, metrics_dir):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, index, port, mix, stop_at, record_from, think, rng_seed):
+        super().__init__(daemon=True)
+        self.port = port
+        self.mix_ops, self.mix_weights = zip(*mix.items())
+        self.stop_at = stop_at
+        self.record_from = record_from
+        self.think = think
+        self.rng = random.Random(rng_seed)
+        self.username = f"lt_user{index}"
+        self.user_id = None
+        self.token = None
+        self.post_ids = []
+        self.ip = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+        self.samples = []
+        self.conn = None
+
+    def request(self, method, path, body=None, auth=False):
+        headers = {'X-Forwarded-For': self.ip, 'Accept-Encoding': 'gzip'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if auth and self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.conn.close()
+                    self.conn = None
+                return response.status, data, response.getheader('Content-Encoding')
+            except (http.client.HTTPException, OSError):
+                # connexion fermée par le serveur entre deux requêtes : une seule nouvelle tentative
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+    def json(self, status, data, encoding):
+        if status >= 400 or not data:
+            return None
+        if encoding == 'gzip':
+            data = gzip.decompress(data)
+        return json.loads(data)
+
+    # actions du mélange : chacune renvoie le statut HTTP
+    def op_login(self):
+        status, data, encoding = self.request('POST', '/api/user/login', {"identifier": self.username, "password": PASSWORD})
+        payload = self.json(status, data, encoding)
+        if payload:
+            self.token, self.user_id = payload["token"], payload["user"]["id"]
+        return status
+
+    def op_feed(self):
+        status, data, encoding = self.request('GET', '/api/posts?per_page=20&page=%d' % self.rng.randint(1, 3))
+        payload = self.json(status, data, encoding)
+        if payload:
+            self.post_ids = [post["id"] for post in payload] or self.post_ids
+        return status
+
+    def op_post(self):
+        return self.request('GET', f"/api/posts/{self.pick_post()}")[0]
+
+    def op_vote(self):
+        body = {"user_id": self.user_id, "is_like": self.rng.random() < 0.8}
+        return self.request('POST', f"/api/likes/post/{self.pick_post()}", body)[0]
+
+    def op_comment(self):
+        body = {"content": "Commentaire de charge", "post_id": self.pick_post(), "user_id": self.user_id}
+        return self.request('POST', '/api/comments/', body)[0]
+
+    def op_notifications(self):
+        return self.request('GET', '/api/notifications/unread_count', auth=True)[0]
+
+    def pick_post(self):
+        return self.rng.choice(self.post_ids) if self.post_ids else 1
+
+    def run(self):
+        try:
+            self.op_login()
+            self.op_feed()
+        except OSError:
+            pass
+        while time.time() < self.stop_at:
+            op = self.rng.choices(self.mix_ops, self.mix_weights)[0]
+            start = time.perf_counter()
+            try:
+                status = getattr(self, f"op_{op}")()
+            except (http.client.HTTPException, OSError):
+                status = 0
+            elapsed = time.perf_counter() - start
+            if time.time() >= self.record_from:
+                self.samples.append((op, status, elapsed))
+            if self.think:
+                time.sleep(self.rng.expovariate(1 / self.think))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(int(round(p / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)]
+
+
+def summarize(samples, duration):
+    groups = defaultdict(list)
+    for op, status, elapsed in samples:
+        groups[op].append((status, elapsed))
+        groups['total'].append((status, elapsed))
+    summary = {}
+    for op, rows in groups.items():
+        latencies = sorted(elapsed for _, elapsed in rows)
+        summary[op] = {
+            "requests": len(rows),
+            "rps": len(rows) / duration,
+            # 0 = erreur de connexion ; les 4xx attendues (ex. 429) sont comptées à part
+            "errors": sum(1 for status, _ in rows if status == 0 or status >= 500) / len(rows),
+            "client_errors": sum(1 for status, _ in rows if 400 <= status < 500) / len(rows),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        }
+    return summary
+
+
+def print_summary(title, summary):
+    print(f"\n{title}")
+    print(f"{'action':<15}{'req':>8}{'req/s':>9}{'err':>8}{'4xx':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for op in sorted(summary, key=lambda name: (name == 'total', name)):
+        s = summary[op]
+        print(f"{op:<15}{s['requests']:>8}{s['rps']:>9.1f}{s['errors']:>8.1%}{s['client_errors']:>8.1%}"
+              f"{s['p50'] * 1000:>9.1f}{s['p95'] * 1000:>9.1f}{s['p99'] * 1000:>9.1f}")
+
+
+def parse_mix(raw):
+    mix = {}
+    for item in raw.split(','):
+        op, _, weight = item.partition('=')
+        if not hasattr(VirtualUser, f"op_{op.strip()}"):
+            sys.exit(f"Action inconnue dans --mix : {op}")
+        if float(weight) > 0:
+            mix[op.strip()] = float(weight)
+    return mix
+
+
+def run_once(args, workers):
+    smtp = start_smtp_sink()
+    port = args.port
+    process, metrics_dir = start_server(args, workers, port, smtp.server_address[1])
+    try:
+        start = time.time()
+        record_from = start + args.warmup
+        stop_at = record_from + args.duration
+        mix = parse_mix(args.mix)
+        users = [
+            VirtualUser(i % args.seeded_users, port, mix, stop_at, record_from, args.think_ms / 1000, args.rng_seed + i)
+            for i in range(args.users)
+        ]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join(timeout=args.warmup + args.duration + 60)
+        samples = [sample for user in users for sample in user.samples]
+        return summarize(samples, args.duration)
+    finally:
+        stop_server(process, metrics_dir)
+        smtp.shutdown()
+
+
+def run(args):
+    summary = run_once(args, args.workers)
+    print_summary(f"{args.workers} worker(s) x {args.threads} thread(s), {args.users} membres virtuels", summary)
+
+
+def sweep(args):
+    # le point de saturation est le premier palier qui n'apporte plus de débit significatif
+    # ou qui dépasse l'objectif de latence p99
+    results = []
+    for workers in [int(w) for w in args.workers.split(',')]:
+        summary = run_once(args, workers)
+        print_summary(f"{workers} worker(s) x {args.threads} thread(s), {args.users} membres virtuels", summary)
+        results.append((workers, summary.get('total')))
+    print(f"\n{'workers':>8}{'req/s':>9}{'p99 ms':>9}{'err':>8}")
+    saturation = None
+    previous = None
+    for workers, total in results:
+        if total is None:
+            continue
+        print(f"{workers:>8}{total['rps']:>9.1f}{total['p99'] * 1000:>9.1f}{total['errors']:>8.1%}")
+        gain = (total['rps'] / previous['rps'] - 1) if previous and previous['rps'] else None
+        if saturation is None and (
+            total['p99'] * 1000 > args.p99_slo_ms or total['errors'] > 0.01
+            or (gain is not None and gain < args.min_gain)
+        ):
+            saturation = workers
+        previous = total
+    if saturation is None:
+        print("\nPas de saturation atteinte sur la plage testée")
+    else:
+        print(f"\nSaturation à {saturation} worker(s) (gain < {args.min_gain:.0%}, p99 > {args.p99_slo_ms} ms ou erreurs > 1 %)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge AEEDK")
+    parser.add_argument('--database-url', default=os.getenv('LOADTEST_DATABASE_URL', DEFAULT_DATABASE_URL))
+    parser.add_argument('--rng-seed', type=int, default=42, help="graine aléatoire")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help="crée et peuple la base de test")
+    seed_parser.add_argument('--users', type=int, default=200)
+    seed_parser.add_argument('--posts', type=int, default=300)
+    seed_parser.add_argument('--comments', type=int, default=10, help="commentaires moyens par post")
+    seed_parser.add_argument('--votes', type=int, default=15, help="votes moyens par post")
+    seed_parser.add_argument('--yes', action='store_true', help="autorise une base non SQLite")
+    seed_parser.set_defaults(handler=seed)
+
+    for name, handler, workers_default in (('run', run, '2'), ('sweep', sweep, '1,2,4,8')):
+        command = commands.add_parser(name)
+        command.add_argument('--workers', type=int if name == 'run' else str, default=workers_default)
+        command.add_argument('--threads', type=int, default=1, help="threads par worker gunicorn")
+        command.add_argument('--users', type=int, default=16, help="membres virtuels simultanés")
+        command.add_argument('--seeded-users', type=int, default=200, help="comptes créés par seed")
+        command.add_argument('--duration', type=float, default=30, help="secondes mesurées")
+        command.add_argument('--warmup', type=float, default=5)
+        command.add_argument('--think-ms', type=float, default=0, help="pause moyenne entre deux actions")
+        command.add_argument('--mix', default=DEFAULT_MIX)
+        command.add_argument('--port', type=int, default=8765)
+        command.add_argument('--admission', action='store_true', help="active le contrôle d'admission")
+        if name == 'sweep':
+            command.add_argument('--p99-slo-ms', type=float, default=500)
+            command.add_argument('--min-gain', type=float, default=0.1)
+        command.set_defaults(handler=handler)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
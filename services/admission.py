@@ -0,0 +1,218 @@
+import math
+import os
+import threading
+import time
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from services import metrics
+
+# Contrôle d'admission, avant tout accès à la base :
+#  - seaux à jetons par IP et par utilisateur (JWT), chaque route coûtant un nombre de jetons ;
+#  - nombre maximal de requêtes simultanées sur les routes coûteuses.
+# Un refus est immédiat (429 ou 503 + Retry-After) pour ne pas occuper un worker.
+# Backend "memory" : état propre à chaque process gunicorn ; "redis" : état partagé entre workers.
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'True') == 'True'
+ADMISSION_BACKEND = os.getenv('ADMISSION_BACKEND', 'memory')
+ADMISSION_REDIS_URL = os.getenv('ADMISSION_REDIS_URL', 'redis://localhost:6379/0')
+ADMISSION_IP_RATE = float(os.getenv('ADMISSION_IP_RATE', 20))
+ADMISSION_IP_BURST = float(os.getenv('ADMISSION_IP_BURST', 60))
+ADMISSION_USER_RATE = float(os.getenv('ADMISSION_USER_RATE', 10))
+ADMISSION_USER_BURST = float(os.getenv('ADMISSION_USER_BURST', 30))
+ADMISSION_BUSY_RETRY_AFTER = int(os.getenv('ADMISSION_BUSY_RETRY_AFTER', 1))
+ADMISSION_MAX_KEYS = int(os.getenv('ADMISSION_MAX_KEYS', 10000))
+# nombre de proxys de confiance devant l'app pour lire l'IP dans X-Forwarded-For. Défaut 1 (Render) :
+# à 0 derrière un proxy, tous les clients partageraient le seau de l'IP du proxy.
+# Sans proxy (accès direct), passer à 0 pour ignorer un X-Forwarded-For fourni par le client.
+ADMISSION_PROXY_HOPS = int(os.getenv('ADMISSION_PROXY_HOPS', 1))
+
+EXEMPT_ENDPOINTS = {'metrics_bp.prometheus_metrics', 'static', 'media'}
+
+
+def _parse_limits(raw, defaults):
+    # format : "endpoint=valeur,endpoint=valeur" ; complète ou remplace les valeurs par défaut
+    limits = dict(defaults)
+    for item in filter(None, (part.strip() for part in (raw or '').split(','))):
+        endpoint, _, value = item.partition('=')
+        limits[endpoint.strip()] = int(value)
+    return limits
+
+
+ROUTE_COSTS = _parse_limits(os.getenv('ADMISSION_ROUTE_COSTS'), {
+    'comment_bp.get_all_comments': 10,
+    'post_bp.create_post': 20,
+    'user.login': 10,
+    'user.register': 20,
+    'user.forgot_password': 20,
+    'user.reset_password': 10,
+    'contact_bp.send_contact_email': 20,
+    # signatures d'upload distribuées sans authentification (avatar à l'inscription)
+    'upload_bp.sign_upload': 20,
+})
+# login, register et reset_password hachent un mot de passe : avec ADMISSION_BACKEND=redis,
+# leur limite borne le CPU de hachage pour l'ensemble des workers
+ROUTE_CONCURRENCY = _parse_limits(os.getenv('ADMISSION_CONCURRENCY'), {
+    'comment_bp.get_all_comments': 2,
+    'post_bp.create_post': 2,
+    'user.login': 4,
+    'user.register': 2,
+    'user.reset_password': 2,
+})
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._buckets = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost):
+        # renvoie (accepté, secondes à attendre avant d'avoir assez de jetons)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, _ = self._buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if len(self._buckets) > ADMISSION_MAX_KEYS:
+                # un seau de nouveau plein équivaut à un seau absent
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+        return allowed, 0 if allowed else (cost - tokens) / rate
+
+    def acquire(self, key, limit):
+        with self._lock:
+            if self._slots.get(key, 0) >= limit:
+                return False
+            self._slots[key] = self._slots.get(key, 0) + 1
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._slots[key] = max(self._slots.get(key, 1) - 1, 0)
+
+
+class RedisBackend:
+    # seau à jetons atomique côté Redis ; les nombres Lua sont renvoyés en chaîne pour garder les décimales
+    TAKE_SCRIPT = """
+    local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local allowed = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+    # filet de sécurité : un worker tué sans teardown ne bloque pas un créneau indéfiniment
+    SLOT_TTL = 60
+
+    def __init__(self, url):
+        self.url = url
+        self._client = None
+        self._take = None
+
+    def _redis(self):
+        # redis n'est importé que si ce backend est réellement utilisé
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url, socket_timeout=0.1)
+            self._take = self._client.register_script(self.TAKE_SCRIPT)
+        return self._client
+
+    def take(self, key, rate, burst, cost):
+        self._redis()
+        allowed, tokens = self._take(keys=[f"admission:{key}"], args=[rate, burst, cost, time.time()])
+        tokens = float(tokens)
+        return bool(allowed), 0 if allowed else (cost - tokens) / rate
+
+    def acquire(self, key, limit):
+        client = self._redis()
+        key = f"admission:{key}"
+        count, _ = client.pipeline().incr(key).expire(key, self.SLOT_TTL).execute()
+        if count > limit:
+            client.decr(key)
+            return False
+        return True
+
+    def release(self, key):
+        self._redis().decr(f"admission:{key}")
+
+
+def client_ip():
+    chain = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+    chain.append(request.remote_addr or 'unknown')
+    return chain[max(len(chain) - 1 - ADMISSION_PROXY_HOPS, 0)]
+
+
+def _current_user():
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        # jeton invalide ou expiré : la route elle-même renverra l'erreur adéquate
+        return None
+
+
+def _reject(status, reason, endpoint, retry_after, message):
+    metrics.ADMISSION_REJECTIONS.labels(reason=reason, endpoint=endpoint).inc()
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(int(math.ceil(retry_after)), 1))
+    return response
+
+
+def _fail_open(action, *args):
+    # le backend partagé indisponible ne doit pas rendre toute l'API indisponible
+    try:
+        return action(*args)
+    except Exception:
+        current_app.logger.exception("Contrôle d'admission indisponible")
+        return None
+
+
+def admit():
+    if request.method == 'OPTIONS' or request.endpoint in EXEMPT_ENDPOINTS:
+        return None
+    backend = current_app.extensions['admission']
+    endpoint = request.endpoint or 'unmatched'
+    cost = ROUTE_COSTS.get(endpoint, 1)
+
+    buckets = [(f"ip:{client_ip()}", ADMISSION_IP_RATE, ADMISSION_IP_BURST)]
+    user_id = _current_user()
+    if user_id:
+        buckets.append((f"user:{user_id}", ADMISSION_USER_RATE, ADMISSION_USER_BURST))
+    for key, rate, burst in buckets:
+        result = _fail_open(backend.take, key, rate, burst, min(cost, burst))
+        if result is not None and not result[0]:
+            return _reject(429, 'rate', endpoint, result[1], "Trop de requêtes, réessayez plus tard")
+
+    limit = ROUTE_CONCURRENCY.get(endpoint)
+    if limit:
+        slot = f"concurrency:{endpoint}"
+        acquired = _fail_open(backend.acquire, slot, limit)
+        if acquired is False:
+            return _reject(503, 'busy', endpoint, ADMISSION_BUSY_RETRY_AFTER, "Service momentanément surchargé, réessayez plus tard")
+        if acquired:
+            g.admission_slot = slot
+    return None
+
+
+def init_app(app):
+    app.extensions['admission'] = (
+        RedisBackend(ADMISSION_REDIS_URL) if ADMISSION_BACKEND == 'redis' else MemoryBackend()
+    )
+    if not ADMISSION_ENABLED:
+        return
+    app.before_request(admit)
+
+    @app.teardown_request
+    def release_slot(exc):
+        slot = g.pop('admission_slot', None)
+        if slot:
+            _fail_open(app.extensions['admission'].release, slot)
@@ -0,0 +1,57 @@
+import os
+import time
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from services.db_routing import READ_AFTER_WRITE_COOKIE, REPLICA_BIND
+
+# Moteurs SQLAlchemy asynchrones des routes de lecture servies en ASGI (routes/async_r.py).
+# Mêmes bases que l'app Flask (DATABASE_URL, DATABASE_REPLICA_URL), avec le pilote asynchrone
+# équivalent. Une connexion n'est empruntée que le temps des requêtes SQL : les milliers de
+# connexions HTTP inactives (polling, SSE) n'en occupent aucune.
+ASYNC_DRIVERS = {'mysql': 'aiomysql', 'sqlite': 'aiosqlite'}
+ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', 10))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv('ASYNC_DB_MAX_OVERFLOW', 10))
+ASYNC_DB_POOL_TIMEOUT = int(os.getenv('ASYNC_DB_POOL_TIMEOUT', 10))
+
+
+def async_url(url):
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Aucun pilote asynchrone connu pour la base {backend}")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def _engine(url):
+    url = async_url(url)
+    options = {"pool_recycle": 280, "pool_pre_ping": True}
+    if url.get_backend_name() != 'sqlite':
+        options.update(
+            pool_size=ASYNC_DB_POOL_SIZE,
+            max_overflow=ASYNC_DB_MAX_OVERFLOW,
+            pool_timeout=ASYNC_DB_POOL_TIMEOUT,
+        )
+    return create_async_engine(url, **options)
+
+
+class AsyncDatabase:
+    def __init__(self, config):
+        self.engines = [_engine(config['SQLALCHEMY_DATABASE_URI'])]
+        replica_url = (config.get('SQLALCHEMY_BINDS') or {}).get(REPLICA_BIND)
+        if replica_url:
+            self.engines.append(_engine(replica_url))
+        self._primary = async_sessionmaker(self.engines[0])
+        self._replica = async_sessionmaker(self.engines[-1])
+
+    def session(self, cookies):
+        # même règle que db_routing : réplica, sauf juste après une écriture du client
+        primary_until = cookies.get(READ_AFTER_WRITE_COOKIE)
+        try:
+            use_primary = float(primary_until) >= time.time()
+        except (TypeError, ValueError):
+            use_primary = False
+        return (self._primary if use_primary else self._replica)()
+
+    async def dispose(self):
+        for engine in self.engines:
+            await engine.dispose()
@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compression négociée (Accept-Encoding) des réponses texte/JSON. Les médias déjà compressés
+# (images, vidéos, archives) et les fichiers servis en direct_passthrough ne sont pas touchés.
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+COMPRESS_CACHE_SIZE = int(os.getenv('COMPRESS_CACHE_SIZE', 128))
+COMPRESS_CACHE_MAX_BODY = int(os.getenv('COMPRESS_CACHE_MAX_BODY', 1024 * 1024))
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/xml', 'text/javascript',
+}
+
+
+def _compress(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+class CompressedCache:
+    # Le même corps (fil public, post populaire) est servi à de nombreux clients : le résultat
+    # compressé est gardé en LRU, indexé par l'empreinte du corps non compressé.
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, encoding, data):
+        if self.size <= 0 or len(data) > COMPRESS_CACHE_MAX_BODY:
+            return _compress(encoding, data)
+        key = (encoding, hashlib.blake2b(data, digest_size=16).digest())
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                return body
+        body = _compress(encoding, data)
+        with self._lock:
+            self._entries[key] = body
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return body
+
+
+cache = CompressedCache(COMPRESS_CACHE_SIZE)
+
+
+def _stream(encoding, source, chunks):
+    # chaque morceau est vidé (sync flush) pour que le client le reçoive sans attendre la fin
+    try:
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+            for chunk in chunks:
+                yield compressor.process(chunk) + compressor.flush()
+            yield compressor.finish()
+        else:
+            compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            for chunk in chunks:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield compressor.flush()
+    finally:
+        # le générateur d'origine (stream_with_context...) doit toujours être fermé
+        if hasattr(source, 'close'):
+            source.close()
+
+
+def choose_encoding():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compressible(response):
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return False
+    return response.is_streamed or (response.content_length or 0) >= COMPRESS_MIN_SIZE
+
+
+def compress_response(response):
+    response.vary.add('Accept-Encoding')
+    if request.method == 'HEAD' or not compressible(response):
+        return response
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = _stream(encoding, response.response, response.iter_encoded())
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(cache.get_or_compress(encoding, response.get_data()))
+    response.headers['Content-Encoding'] = encoding
+    if response.headers.get('ETag') and not response.headers['ETag'].startswith('W/'):
+        # le corps transmis diffère : l'ETag fort n'est plus valable tel quel
+        response.headers['ETag'] = 'W/' + response.headers['ETag']
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
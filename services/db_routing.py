@@ -0,0 +1,88 @@
+import os
+import time
+from functools import wraps
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA_BIND = 'replica'
+READ_AFTER_WRITE_SECONDS = int(os.getenv('DB_READ_AFTER_WRITE_SECONDS', 5))
+READ_AFTER_WRITE_COOKIE = 'aeedk_primary_until'
+
+# Un worker gunicorn synchrone ne sert qu'une requête à la fois : le pool n'a besoin que
+# d'une connexion par thread (+1 pour les tâches de fond). Total côté MySQL :
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) par base.
+WORKER_THREADS = int(os.getenv('GUNICORN_THREADS', 1))
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', WORKER_THREADS + 1))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', WORKER_THREADS))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 10))
+
+
+def engine_options(url):
+    from services.metrics import TimedQueuePool
+    options = {"pool_recycle": 280, "pool_pre_ping": True}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        # SQLite en mémoire : Flask-SQLAlchemy impose un StaticPool
+        return options
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    return options
+
+
+def _replica_allowed(clause):
+    if not has_request_context() or not g.get('db_replica') or g.get('db_wrote'):
+        return False
+    return not getattr(clause, 'is_dml', False)
+
+
+class RoutingSession(Session):
+    # Les lectures des requêtes GET partent sur le bind "replica" ; les flush, les
+    # instructions DML et toute lecture qui suit une écriture restent sur le primaire.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _replica_allowed(clause):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+def use_primary(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.db_replica = False
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def init_app(app):
+    @app.before_request
+    def choose_bind():
+        if request.method != 'GET' or REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+            return
+        primary_until = request.cookies.get(READ_AFTER_WRITE_COOKIE, type=float) or 0
+        g.db_replica = primary_until < time.time()
+
+    @app.after_request
+    def remember_write(response):
+        # le client relit sur le primaire pendant quelques secondes après sa propre écriture
+        # (sans réplica, toutes les lectures partent déjà sur le primaire : pas de cookie)
+        has_replica = REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {})
+        if has_replica and g.get('db_wrote') and READ_AFTER_WRITE_SECONDS > 0:
+            response.set_cookie(
+                READ_AFTER_WRITE_COOKIE, str(time.time() + READ_AFTER_WRITE_SECONDS),
+                max_age=READ_AFTER_WRITE_SECONDS, httponly=True, secure=request.is_secure,
+                samesite='None' if request.is_secure else 'Lax'
+            )
+        return response
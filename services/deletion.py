@@ -0,0 +1,146 @@
+import os
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, insert, or_, select, update
+from extensions import db
+from models.comment import Comment
+from models.like import Like
+from models.notification import Notification
+from models.notification_archive import NotificationArchive
+from models.post import Post
+from models.post_score import PostScore
+from models.tombstone import Tombstone
+from models.user import User
+from services import media_store, ranking
+from services.notifications import POST_TARGET_TYPES
+
+DELETE_CHUNK_SIZE = int(os.getenv('DELETE_CHUNK_SIZE', 1000))
+
+# Suppressions ensemblistes : quelques DELETE ... WHERE au lieu de charger chaque objet
+# dépendant pour le supprimer ligne par ligne via les cascades de l'ORM.
+
+
+def _execute(statement):
+    return db.session.execute(statement.execution_options(synchronize_session=False))
+
+
+def _chunks(ids):
+    for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+        yield ids[i:i + DELETE_CHUNK_SIZE]
+
+
+def _comment_subtree_ids(seed):
+    tree = select(Comment.id).where(seed).cte('comment_tree', recursive=True)
+    tree = tree.union_all(select(Comment.id).where(Comment.parent_comment_id == tree.c.id))
+    return sorted({row[0] for row in db.session.execute(select(tree.c.id))})
+
+
+def _bury(content_type, ids):
+    # pierres tombales lues par /api/sync pour propager la suppression aux clients
+    if ids:
+        now = datetime.utcnow()
+        db.session.execute(insert(Tombstone), [
+            {"content_type": content_type, "content_id": content_id, "deleted_at": now} for content_id in ids
+        ])
+
+
+def _delete_comments(ids):
+    for chunk in _chunks(ids):
+        _execute(delete(Like).where(Like.content_type == 'comment', Like.content_id.in_(chunk)))
+    # MySQL vérifie la clé étrangère parent_comment_id ligne par ligne : on détache
+    # d'abord les réponses pour que l'ordre des suppressions n'importe pas.
+    for chunk in _chunks(ids):
+        _execute(update(Comment).where(Comment.id.in_(chunk)).values(parent_comment_id=None))
+    for chunk in _chunks(ids):
+        _execute(delete(Comment).where(Comment.id.in_(chunk)))
+
+
+def delete_post_tree(post_id):
+    comment_ids = select(Comment.id).where(Comment.post_id == post_id).scalar_subquery()
+    try:
+        _bury('comment', list(db.session.scalars(select(Comment.id).where(Comment.post_id == post_id))))
+        media_store.release(media_store.media_urls(
+            db.session.execute(select(Post.media).where(Post.id == post_id)).scalar()
+        ))
+        _execute(delete(Like).where(Like.content_type == 'comment', Like.content_id.in_(comment_ids)))
+        _execute(delete(Like).where(Like.content_type == 'post', Like.content_id == post_id))
+        _execute(update(Comment).where(Comment.post_id == post_id).values(parent_comment_id=None))
+        _execute(delete(Comment).where(Comment.post_id == post_id))
+        _execute(delete(PostScore).where(PostScore.post_id == post_id))
+        _execute(delete(Notification).where(Notification.type.in_(POST_TARGET_TYPES), Notification.target_id == post_id))
+        deleted = _execute(delete(Post).where(Post.id == post_id)).rowcount
+        if deleted:
+            _bury('post', [post_id])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return deleted > 0
+
+
+def delete_comment_tree(comment_id, post_id):
+    try:
+        ids = _comment_subtree_ids(Comment.id == comment_id)
+        _bury('comment', ids)
+        _delete_comments(ids)
+        ranking.refresh_post(post_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(ids)
+
+
+def delete_user_tree(user_id):
+    post_ids = select(Post.id).where(Post.author_id == user_id).scalar_subquery()
+    try:
+        media_store.release(
+            [url for media in db.session.scalars(select(Post.media).where(Post.author_id == user_id))
+             for url in media_store.media_urls(media)]
+            + list(db.session.scalars(select(User.avatar).where(User.id == user_id)))
+        )
+        # commentaires de l'utilisateur, commentaires sur ses posts, et toutes leurs réponses
+        comment_tree = _comment_subtree_ids(or_(Comment.user_id == user_id, Comment.post_id.in_(post_ids)))
+        own_posts = set(db.session.scalars(select(Post.id).where(Post.author_id == user_id)))
+        # posts d'autres membres qui perdent des commentaires ou un vote : scores à recalculer
+        touched_posts = set(db.session.scalars(
+            select(Like.content_id).where(Like.user_id == user_id, Like.content_type == 'post')
+        ))
+        for chunk in _chunks(comment_tree):
+            touched_posts.update(db.session.scalars(select(Comment.post_id).where(Comment.id.in_(chunk))))
+        _bury('comment', comment_tree)
+        _bury('post', sorted(own_posts))
+        _delete_comments(comment_tree)
+        _execute(delete(Like).where(Like.content_type == 'post', Like.content_id.in_(post_ids)))
+        _execute(delete(Like).where(Like.user_id == user_id))
+        _execute(delete(PostScore).where(PostScore.post_id.in_(post_ids)))
+        _execute(delete(Notification).where(Notification.type.in_(POST_TARGET_TYPES), Notification.target_id.in_(post_ids)))
+        _execute(delete(Post).where(Post.author_id == user_id))
+        _execute(delete(Notification).where(Notification.recipient_id == user_id))
+        _execute(delete(NotificationArchive).where(NotificationArchive.recipient_id == user_id))
+        deleted = _execute(delete(User).where(User.id == user_id)).rowcount
+        for post_id in sorted(touched_posts - own_posts):
+            ranking.refresh_post(post_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return deleted > 0
+
+
+def delete_user_tree_in_background(user_id):
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                delete_user_tree(user_id)
+            except Exception:
+                app.logger.exception("Échec de la suppression de l'utilisateur %s", user_id)
+            finally:
+                db.session.remove()
+
+    thread = threading.Thread(target=run, name=f"delete-user-{user_id}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,172 @@
+import hashlib
+import hmac
+import os
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models.idempotency_key import IdempotencyKey
+from services import admission, metrics
+
+# En-tête Idempotency-Key sur les créations coûteuses (uploads, envoi de notifications) :
+# la première requête s'exécute et sa réponse est enregistrée ; une nouvelle tentative avec
+# la même clé reçoit la réponse enregistrée sans rien ré-exécuter. Stockage en base, donc
+# partagé entre les workers gunicorn. L'en-tête reste facultatif.
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+IDEMPOTENCY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_TTL_HOURS', 24))
+# au-delà, une requête "en cours" est considérée comme abandonnée (worker tué) : à garder
+# supérieur au timeout des workers gunicorn
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 120))
+IDEMPOTENCY_MAX_KEY_LENGTH = 255
+
+
+def _caller():
+    # une clé ne vaut que pour son appelant : utilisateur authentifié, sinon IP du client
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None
+    return f"user:{identity}" if identity else f"ip:{admission.client_ip()}"
+
+
+def _fingerprint():
+    # Empreinte du contenu de la requête, indépendante du séparateur multipart choisi par le client.
+    # HMAC avec SECRET_KEY : le corps contient des mots de passe (register), une empreinte nue
+    # stockée en base permettrait de les retrouver par force brute.
+    digest = hmac.new(current_app.config['SECRET_KEY'].encode(), digestmod=hashlib.sha256)
+    digest.update(f"{request.method} {request.path}\n".encode())
+    for name, value in sorted(request.form.items(multi=True), key=lambda item: item[0]):
+        digest.update(f"form:{name}={value}\n".encode())
+    for name, file in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+        digest.update(f"file:{name}={file.filename}\n".encode())
+        for chunk in iter(lambda: file.stream.read(64 * 1024), b''):
+            digest.update(chunk)
+        file.stream.seek(0)
+    # corps JSON ; vide pour un formulaire, déjà lu par le parsing ci-dessus
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _error(status, message, retry_after=None):
+    response = jsonify({"error": message})
+    response.status_code = status
+    if retry_after:
+        response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _claim(scope, caller, key, fingerprint):
+    # Réserve la clé pour cette requête. Renvoie None si la vue doit s'exécuter,
+    # sinon la réponse à renvoyer immédiatement.
+    now = datetime.utcnow()
+    lease = {
+        "fingerprint": fingerprint,
+        "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        "created_at": now,
+        "expires_at": now + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+    }
+    db.session.add(IdempotencyKey(scope=scope, caller=caller, key=key, **lease))
+    try:
+        db.session.commit()
+        return None
+    except IntegrityError:
+        db.session.rollback()
+
+    # clé expirée, ou tentative précédente abandonnée en cours de route : on la reprend
+    taken = db.session.execute(
+        update(IdempotencyKey).where(
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.caller == caller,
+            IdempotencyKey.key == key,
+            or_(
+                IdempotencyKey.expires_at < now,
+                and_(
+                    IdempotencyKey.status_code.is_(None),
+                    IdempotencyKey.locked_until < now,
+                    IdempotencyKey.fingerprint == fingerprint,
+                ),
+            ),
+        ).values(status_code=None, body=None, mimetype=None, **lease)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if taken:
+        return None
+
+    record = db.session.get(IdempotencyKey, (scope, caller, key))
+    if record is None or record.status_code is None:
+        metrics.IDEMPOTENCY_REQUESTS.labels(scope=scope, outcome='in_progress').inc()
+        return _error(409, "Une requête avec cette clé est déjà en cours de traitement", retry_after=1)
+    if record.fingerprint != fingerprint:
+        metrics.IDEMPOTENCY_REQUESTS.labels(scope=scope, outcome='mismatch').inc()
+        return _error(422, "Cette clé d'idempotence a déjà été utilisée pour une autre requête")
+    metrics.IDEMPOTENCY_REQUESTS.labels(scope=scope, outcome='replayed').inc()
+    response = current_app.response_class(record.body, status=record.status_code, mimetype=record.mimetype)
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _finish(scope, caller, key, response):
+    # tout ce que la vue n'a pas validé est abandonné, comme en fin de requête
+    db.session.rollback()
+    record = (
+        IdempotencyKey.scope == scope, IdempotencyKey.caller == caller, IdempotencyKey.key == key,
+        IdempotencyKey.status_code.is_(None),
+    )
+    if response is None or response.status_code >= 500:
+        # échec côté serveur : la clé est libérée, la nouvelle tentative s'exécutera
+        db.session.execute(delete(IdempotencyKey).where(*record).execution_options(synchronize_session=False))
+    else:
+        db.session.execute(
+            update(IdempotencyKey).where(*record).values(
+                status_code=response.status_code, body=response.get_data(), mimetype=response.mimetype,
+                locked_until=None,
+            ).execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+
+def idempotent(scope):
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > IDEMPOTENCY_MAX_KEY_LENGTH:
+                return _error(400, f"{IDEMPOTENCY_HEADER} trop longue (max {IDEMPOTENCY_MAX_KEY_LENGTH} caractères)")
+
+            caller = _caller()
+            early = _claim(scope, caller, key, _fingerprint())
+            if early is not None:
+                return early
+            response = None
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                _finish(scope, caller, key, response)
+            metrics.IDEMPOTENCY_REQUESTS.labels(scope=scope, outcome='executed').inc()
+            return response
+        return wrapped
+    return decorator
+
+
+def prune_expired():
+    deleted = db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+
+def init_app(app):
+    @app.cli.command('prune-idempotency-keys')
+    def prune_idempotency_keys_command():
+        # à planifier (cron Render) avec les autres purges
+        print(f"{prune_expired()} clés d'idempotence expirées supprimées")
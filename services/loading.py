@@ -0,0 +1,85 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased, joinedload, load_only, selectinload, with_expression
+from models.comment import Comment
+from models.like import Like
+from models.post import Post
+from models.user import User
+
+# Profils de chargement nommés : chaque route sérialise les mêmes objets de la même façon,
+# le profil charge donc en amont les relations et compteurs que to_dict() utilise.
+# Le nombre de requêtes d'une route ne dépend alors plus du nombre d'auteurs ou de commentaires
+# (pour comment_thread : une requête de plus par niveau de profondeur).
+
+# colonnes lues par User.to_dict() (pas de hash de mot de passe ni de jetons)
+USER_PROFILE_COLUMNS = (
+    User.username, User.email, User.first_name, User.last_name, User.birth_date, User.sub_prefecture,
+    User.village, User.avatar, User.role, User.confirmed, User.phone, User.last_active,
+)
+# colonnes du résumé d'auteur de Comment.to_dict()
+USER_SUMMARY_COLUMNS = (User.username, User.avatar)
+
+
+def _vote_count(model, content_type, is_like):
+    return select(func.count(Like.id)).where(
+        Like.content_type == content_type, Like.content_id == model.id, Like.is_like == is_like
+    ).correlate(model).scalar_subquery()
+
+
+def _post_counters():
+    return (
+        with_expression(Post.like_count, _vote_count(Post, 'post', True)),
+        with_expression(Post.dislike_count, _vote_count(Post, 'post', False)),
+        with_expression(Post.comment_total, select(func.count(Comment.id)).where(
+            Comment.post_id == Post.id
+        ).correlate(Post).scalar_subquery()),
+    )
+
+
+def _comment_columns():
+    replies = aliased(Comment)
+    return (
+        joinedload(Comment.user).load_only(*USER_SUMMARY_COLUMNS),
+        with_expression(Comment.like_count, _vote_count(Comment, 'comment', True)),
+        with_expression(Comment.dislike_count, _vote_count(Comment, 'comment', False)),
+        with_expression(Comment.reply_total, select(func.count(replies.id)).where(
+            replies.parent_comment_id == Comment.id
+        ).correlate(Comment).scalar_subquery()),
+    )
+
+
+def _comment_tree(depth):
+    # Comment.to_dict(depth) parcourt children jusqu'à depth niveaux
+    options = _comment_columns()
+    if depth > 0:
+        options += (selectinload(Comment.children, recursion_depth=depth).options(*_comment_columns()),)
+    return options
+
+
+def _feed():
+    return (joinedload(Post.author).load_only(*USER_PROFILE_COLUMNS),) + _post_counters()
+
+
+def _post_detail():
+    # les commentaires ne sont pas chargés avec le post : seule leur première page est
+    # servie, lue à part avec le profil comment_thread (routes.comment_r.top_level_page)
+    return _feed()
+
+
+def _comment_thread(depth):
+    return _comment_tree(depth)
+
+
+def _admin_users():
+    return (load_only(*USER_PROFILE_COLUMNS),)
+
+
+PROFILES = {
+    'feed': _feed,
+    'post_detail': _post_detail,
+    'comment_thread': _comment_thread,
+    'admin_users': _admin_users,
+}
+
+
+def profile(name, **kwargs):
+    return PROFILES[name](**kwargs)
@@ -0,0 +1,139 @@
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models.media_blob import MediaBlob
+from models.used_upload import UsedUpload
+from services import metrics
+from services.storage import BACKENDS, UPLOAD_KINDS, InvalidUpload, file_extension, media_type, get_storage, hash_stream
+
+# Stockage adressé par contenu : chaque fichier est haché (SHA-256) pendant sa lecture et
+# stocké une seule fois sous son empreinte. User.avatar et Post.media référencent les blobs
+# par URL ; ref_count suit ces références et le ramasse-miettes supprime les blobs orphelins.
+MEDIA_GC_GRACE_SECONDS = int(os.getenv('MEDIA_GC_GRACE_SECONDS', 3600))
+
+
+def claim_upload(key, expires):
+    # première utilisation d'une URL d'upload signée ; toute réutilisation est refusée
+    try:
+        with db.session.begin_nested():
+            db.session.add(UsedUpload(key=key, expires_at=datetime.utcfromtimestamp(expires)))
+    except IntegrityError:
+        raise InvalidUpload("Signature d'upload déjà utilisée")
+
+
+def register_blob(digest, url, backend, extension, size):
+    blob = db.session.get(MediaBlob, digest)
+    if blob is not None:
+        if blob.ref_count <= 0:
+            _revive(digest)
+        return blob
+    try:
+        with db.session.begin_nested():
+            blob = MediaBlob(digest=digest, url=url, backend=backend, extension=extension, size=size, ref_count=0)
+            db.session.add(blob)
+    except IntegrityError:
+        # un autre worker vient d'enregistrer le même contenu
+        blob = db.session.get(MediaBlob, digest)
+    return blob
+
+
+def put(kind, file):
+    ext = file_extension(file.filename)
+    if ext not in UPLOAD_KINDS[kind]["extensions"]:
+        raise InvalidUpload("Format de fichier non autorisé")
+    digest, size, temp_path = hash_stream(file.stream, UPLOAD_KINDS[kind]["max_bytes"])
+    try:
+        blob = db.session.get(MediaBlob, digest)
+        if blob is not None and blob.ref_count <= 0 and not _revive(digest):
+            # le ramasse-miettes vient de supprimer ce blob orphelin : on le renvoie
+            db.session.expunge(blob)
+            blob = None
+        if blob is None:
+            storage = get_storage()
+            with metrics.track_outbound(storage.name):
+                url = storage.put_blob(digest, ext, temp_path)
+            blob = register_blob(digest, url, storage.name, ext, size)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return {"url": blob.url, "filename": file.filename, "type": media_type(ext)}
+
+
+def _revive(digest):
+    # un blob orphelin réutilisé repart pour un délai de grâce complet : collect_garbage
+    # ne supprime que les blobs non référencés et non touchés depuis ce délai
+    return db.session.execute(
+        update(MediaBlob).where(MediaBlob.digest == digest)
+        .values(updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount > 0
+
+
+def media_urls(media):
+    return [m["url"] for m in media or [] if isinstance(m, dict) and m.get("url")]
+
+
+def _adjust(urls, sign):
+    counts = Counter(url for url in urls if url)
+    if not counts:
+        return
+    # une seule instruction : ref_count += n pour chaque URL connue (les URL externes sont ignorées)
+    delta = case(*[(MediaBlob.url == url, n) for url, n in counts.items()], else_=0)
+    db.session.execute(
+        update(MediaBlob).where(MediaBlob.url.in_(list(counts)))
+        .values(ref_count=MediaBlob.ref_count + sign * delta, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def retain(urls):
+    _adjust(urls, 1)
+
+
+def release(urls):
+    _adjust(urls, -1)
+
+
+def swap(old_urls, new_urls):
+    release(old_urls)
+    retain(new_urls)
+
+
+def collect_garbage(grace_seconds=MEDIA_GC_GRACE_SECONDS):
+    # le délai de grâce protège les blobs fraîchement envoyés pas encore rattachés à un post/profil
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    candidates = db.session.execute(
+        select(MediaBlob.digest, MediaBlob.backend, MediaBlob.extension, MediaBlob.size)
+        .where(MediaBlob.ref_count <= 0, MediaBlob.updated_at < cutoff)
+    ).all()
+    # les signatures expirées ne peuvent plus resservir : inutile de les garder
+    db.session.execute(
+        delete(UsedUpload).where(UsedUpload.expires_at < datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    removed, freed = 0, 0
+    for digest, backend, extension, size in candidates:
+        # suppression conditionnelle : le blob a pu être re-référencé ou réutilisé entre-temps
+        deleted = db.session.execute(
+            delete(MediaBlob).where(
+                MediaBlob.digest == digest, MediaBlob.ref_count <= 0, MediaBlob.updated_at < cutoff
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if deleted:
+            BACKENDS[backend].delete_blob(digest, extension)
+            removed += 1
+            freed += size
+    return removed, freed
+
+
+def init_app(app):
+    @app.cli.command('gc-media')
+    def gc_media_command():
+        removed, freed = collect_garbage()
+        print(f"{removed} blobs supprimés ({freed} octets libérés)")
@@ -0,0 +1,142 @@
+import os
+import time
+from contextlib import contextmanager
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# En mode multi-process (gunicorn), PROMETHEUS_MULTIPROC_DIR doit être défini avant l'import :
+# chaque worker écrit ses valeurs dans des fichiers mmap agrégés au moment du scrape.
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', "Durée des requêtes HTTP",
+    ['blueprint', 'route', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+POOL_CHECKOUTS = Counter('db_pool_checkouts_total', "Connexions empruntées au pool", ['engine'])
+POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out', "Connexions actuellement empruntées", ['engine'], multiprocess_mode='livesum'
+)
+POOL_OVERFLOW = Gauge(
+    'db_pool_overflow', "Connexions ouvertes au-delà de pool_size", ['engine'], multiprocess_mode='livesum'
+)
+POOL_WAIT = Histogram(
+    'db_pool_wait_seconds', "Attente pour obtenir une connexion du pool", ['engine'],
+    buckets=(.001, .005, .01, .05, .1, .5, 1, 5, 30)
+)
+OUTBOUND_LATENCY = Histogram(
+    'outbound_call_duration_seconds', "Durée des appels sortants (SMTP, Cloudinary)",
+    ['service', 'outcome'], buckets=LATENCY_BUCKETS
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    'password_hash_duration_seconds', "Durée du hachage / de la vérification des mots de passe, attente comprise",
+    ['operation'], buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5)
+)
+IDEMPOTENCY_REQUESTS = Counter(
+    'idempotency_requests_total', "Requêtes avec Idempotency-Key : exécutées, rejouées ou refusées",
+    ['scope', 'outcome']
+)
+ADMISSION_REJECTIONS = Counter(
+    'admission_rejections_total', "Requêtes refusées par le contrôle d'admission", ['reason', 'endpoint']
+)
+NOTIFICATIONS_RETIRED = Counter(
+    'notification_retention_rows_total', "Notifications archivées ou supprimées par la rétention",
+    ['action', 'state']
+)
+NOTIFICATION_RETENTION_LAST_RUN = Gauge(
+    'notification_retention_last_run_timestamp_seconds', "Fin du dernier passage de la rétention",
+    multiprocess_mode='max'
+)
+
+
+class TimedQueuePool(QueuePool):
+    metrics_name = 'default'
+
+    # _do_get est l'endroit où un thread attend une connexion libre quand le pool est saturé
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.labels(engine=self.metrics_name).observe(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+@contextmanager
+def track_outbound(service):
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        OUTBOUND_LATENCY.labels(service=service, outcome=outcome).observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine, name='default'):
+    engine.pool.metrics_name = name
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_conn, record, proxy):
+        POOL_CHECKOUTS.labels(engine=name).inc()
+        POOL_CHECKED_OUT.labels(engine=name).inc()
+        if isinstance(engine.pool, QueuePool):
+            POOL_OVERFLOW.labels(engine=name).set(max(engine.pool.overflow(), 0))
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_conn, record):
+        POOL_CHECKED_OUT.labels(engine=name).dec()
+
+
+def _record_request(status):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    rule = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_LATENCY.labels(
+        blueprint=request.blueprint or 'app',
+        route=rule,
+        method=request.method,
+        status=str(status),
+    ).observe(time.perf_counter() - start)
+
+
+def render():
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        from prometheus_client import REGISTRY as registry
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_app(app, db):
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        _record_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def observe_failure(exc):
+        # after_request n'est pas appelé si la vue lève une exception non gérée
+        if exc is not None:
+            _record_request(500)
+
+    with app.app_context():
+        for name, engine in db.engines.items():
+            instrument_engine(engine, name or 'default')
@@ -0,0 +1,120 @@
+import os
+import time
+import click
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select
+from extensions import db
+from models.notification import Notification
+from models.notification_archive import NotificationArchive
+from services import metrics
+
+# Rétention de la table notification : au-delà de l'âge configuré pour leur état (lues /
+# non lues), les notifications sont déplacées vers notification_archive (ou supprimées)
+# par petits lots, chacun dans sa propre transaction, pour ne jamais verrouiller longtemps.
+NOTIFICATION_RETENTION_DAYS = {
+    'read': int(os.getenv('NOTIFICATION_RETENTION_READ_DAYS', 30)),
+    'unread': int(os.getenv('NOTIFICATION_RETENTION_UNREAD_DAYS', 180)),
+}
+NOTIFICATION_RETENTION_MODE = os.getenv('NOTIFICATION_RETENTION_MODE', 'archive')
+NOTIFICATION_RETENTION_BATCH = int(os.getenv('NOTIFICATION_RETENTION_BATCH', 500))
+NOTIFICATION_RETENTION_PAUSE = int(os.getenv('NOTIFICATION_RETENTION_PAUSE_MS', 50)) / 1000
+
+ARCHIVED_COLUMNS = [
+    'id', 'recipient_id', 'message', 'type', 'target_id', 'actor_id', 'count',
+    'is_read', 'created_at', 'updated_at',
+]
+
+
+def _expired(state, now):
+    # une rétention <= 0 désactive la purge pour cet état
+    days = NOTIFICATION_RETENTION_DAYS[state]
+    if days <= 0:
+        return None
+    return (
+        Notification.is_read == (state == 'read'),
+        Notification.updated_at < now - timedelta(days=days),
+    )
+
+
+def report(now=None):
+    # simulation : ce que le prochain passage archiverait ou supprimerait, sans rien modifier
+    now = now or datetime.utcnow()
+    states = {}
+    for state, days in NOTIFICATION_RETENTION_DAYS.items():
+        conditions = _expired(state, now)
+        rows, oldest = (0, None) if conditions is None else db.session.execute(
+            select(func.count(Notification.id), func.min(Notification.updated_at)).where(*conditions)
+        ).one()
+        states[state] = {
+            "retention_days": days,
+            "rows": rows,
+            "oldest": oldest.isoformat() if oldest else None,
+        }
+    return {
+        "mode": NOTIFICATION_RETENTION_MODE,
+        "batch_size": NOTIFICATION_RETENTION_BATCH,
+        "total_rows": db.session.scalar(select(func.count(Notification.id))),
+        "states": states,
+    }
+
+
+def _retire_batch(ids, archive):
+    if archive:
+        db.session.execute(insert(NotificationArchive).from_select(
+            ARCHIVED_COLUMNS,
+            select(*[getattr(Notification, column) for column in ARCHIVED_COLUMNS]).where(Notification.id.in_(ids)),
+        ))
+    return db.session.execute(
+        delete(Notification).where(Notification.id.in_(ids)).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def run(mode=NOTIFICATION_RETENTION_MODE, batch_size=NOTIFICATION_RETENTION_BATCH):
+    if mode not in ('archive', 'delete'):
+        raise ValueError(f"NOTIFICATION_RETENTION_MODE invalide : {mode}")
+    archive = mode == 'archive'
+    action = 'archived' if archive else 'deleted'
+    now = datetime.utcnow()
+    retired = {}
+    for state in NOTIFICATION_RETENTION_DAYS:
+        conditions = _expired(state, now)
+        retired[state] = 0
+        while conditions is not None:
+            ids = list(db.session.scalars(
+                select(Notification.id).where(*conditions).order_by(Notification.id).limit(batch_size)
+            ))
+            if not ids:
+                break
+            try:
+                count = _retire_batch(ids, archive)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            retired[state] += count
+            metrics.NOTIFICATIONS_RETIRED.labels(action=action, state=state).inc(count)
+            if len(ids) < batch_size:
+                break
+            # laisse passer les écritures concurrentes entre deux lots
+            time.sleep(NOTIFICATION_RETENTION_PAUSE)
+    metrics.NOTIFICATION_RETENTION_LAST_RUN.set(time.time())
+    return action, retired
+
+
+STATE_LABELS = {'read': 'lues', 'unread': 'non lues'}
+ACTION_LABELS = {'archived': 'archivées', 'deleted': 'supprimées'}
+
+
+def init_app(app):
+    @app.cli.command('compact-notifications')
+    @click.option('--dry-run', is_flag=True, help="Affiche ce qui serait purgé sans rien modifier")
+    def compact_notifications_command(dry_run):
+        # à planifier (cron Render), par exemple une fois par nuit
+        if dry_run:
+            for state, info in report()["states"].items():
+                print(f"{info['rows']} notifications {STATE_LABELS[state]} à purger (plus ancienne : {info['oldest']})")
+            return
+        action, retired = run()
+        print(", ".join(
+            f"{count} notifications {STATE_LABELS[state]} {ACTION_LABELS[action]}" for state, count in retired.items()
+        ))
@@ -0,0 +1,69 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import insert, literal, select
+from extensions import db
+from models.notification import Notification
+from models.user import User
+
+# Les notifications d'un même (destinataire, type, cible) sont regroupées dans une seule
+# ligne tant qu'elle n'est pas lue et qu'elle a été mise à jour dans la fenêtre :
+# la ligne est réécrite avec le compteur et le dernier acteur au lieu d'en insérer une nouvelle.
+NOTIFICATION_COALESCE_SECONDS = int(os.getenv('NOTIFICATION_COALESCE_SECONDS', 24 * 3600))
+
+MESSAGES = {
+    'comment': "Nouveau commentaire sur votre post : {title}",
+    'new_post': "Nouveau post publié : {title}",
+}
+GROUPED_MESSAGES = {
+    'comment': "{count} nouveaux commentaires sur votre post : {title}",
+}
+# types dont target_id est un post (supprimés avec lui)
+POST_TARGET_TYPES = ('comment', 'new_post')
+
+
+def render_message(type, count, title):
+    template = GROUPED_MESSAGES.get(type, MESSAGES[type]) if count > 1 else MESSAGES[type]
+    return template.format(count=count, title=title)[:255]
+
+
+def notify(recipient_id, type, target_id, actor_id, title):
+    # Le commit reste à l'appelant.
+    now = datetime.utcnow()
+    notification = db.session.scalars(
+        select(Notification)
+        .where(
+            Notification.recipient_id == recipient_id,
+            Notification.is_read == False,
+            Notification.type == type,
+            Notification.target_id == target_id,
+            Notification.updated_at >= now - timedelta(seconds=NOTIFICATION_COALESCE_SECONDS),
+        )
+        .order_by(Notification.updated_at.desc())
+        .limit(1)
+        .with_for_update()
+    ).first()
+    if notification is None:
+        notification = Notification(
+            recipient_id=recipient_id, type=type, target_id=target_id, actor_id=actor_id,
+            count=1, message=render_message(type, 1, title), created_at=now, updated_at=now,
+        )
+        db.session.add(notification)
+    else:
+        notification.count += 1
+        notification.actor_id = actor_id
+        notification.message = render_message(type, notification.count, title)
+        notification.updated_at = now
+    return notification
+
+
+def notify_all_users(type, target_id, actor_id, title):
+    # une notification par utilisateur (hors acteur) en une seule instruction INSERT ... SELECT
+    now = datetime.utcnow()
+    source = select(
+        User.id, literal(type), literal(target_id), literal(actor_id), literal(1),
+        literal(render_message(type, 1, title)), literal(False), literal(now), literal(now),
+    ).where(User.id != actor_id)
+    return db.session.execute(insert(Notification).from_select(
+        ['recipient_id', 'type', 'target_id', 'actor_id', 'count', 'message', 'is_read', 'created_at', 'updated_at'],
+        source,
+    )).rowcount
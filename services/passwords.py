@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from flask import jsonify
+
+# Hachage des mots de passe hors du worker web : le calcul (volontairement coûteux) s'exécute
+# dans un petit pool de process, borné en taille et en file d'attente. Au-delà, la requête est
+# refusée (503) au lieu d'occuper un worker. Le coût se règle par variables d'environnement et
+# les anciens hachages sont recalculés à la connexion suivante.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2')
+DEFAULT_COSTS = {'pbkdf2': 1000000, 'scrypt': 32768, 'bcrypt': 12}
+PASSWORD_HASH_COST = int(os.getenv('PASSWORD_HASH_COST', DEFAULT_COSTS.get(PASSWORD_HASH_METHOD, 0)))
+# 0 : hachage dans le thread de la requête. Le pool ne sert qu'avec des workers gthread
+# (GUNICORN_THREADS > 1) : un worker sync attendrait le résultat sans rien servir d'autre, la
+# limite passe alors par le contrôle d'admission (ROUTE_CONCURRENCY de services/admission.py).
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 1 if int(os.getenv('GUNICORN_THREADS', 1)) > 1 else 0))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 4 * max(PASSWORD_HASH_WORKERS, 1)))
+PASSWORD_HASH_WAIT = float(os.getenv('PASSWORD_HASH_WAIT_SECONDS', 2))
+
+if PASSWORD_HASH_METHOD not in DEFAULT_COSTS:
+    raise ValueError(f"PASSWORD_HASH_METHOD invalide : {PASSWORD_HASH_METHOD}")
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def werkzeug_method(method, cost):
+    if method == 'scrypt':
+        return f"scrypt:{cost}:8:1"
+    return f"pbkdf2:sha256:{cost}"
+
+
+# fonctions exécutées dans les process du pool : importables et sans dépendance à Flask
+def compute_hash(method, cost, password):
+    if method == 'bcrypt':
+        import bcrypt
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=cost)).decode()
+    from werkzeug.security import generate_password_hash
+    return generate_password_hash(password, method=werkzeug_method(method, cost), salt_length=16)
+
+
+def compute_check(stored, password):
+    if stored.startswith('$2'):
+        import bcrypt
+        return bcrypt.checkpw(password.encode(), stored.encode())
+    from werkzeug.security import check_password_hash
+    return check_password_hash(stored, password)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE)
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # "spawn" : les process du pool ne héritent ni des connexions ni des threads du worker
+            _pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=get_context('spawn'))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    _pool = None
+
+
+# un worker gunicorn forké ne doit pas réutiliser le pool éventuel du master
+os.register_at_fork(after_in_child=_reset_pool)
+
+
+def _run(operation, fn, *args):
+    from services import metrics
+    start = time.perf_counter()
+    try:
+        if PASSWORD_HASH_WORKERS <= 0:
+            return fn(*args)
+        if not _slots.acquire(timeout=PASSWORD_HASH_WAIT):
+            raise HashingBusy()
+        try:
+            try:
+                return _executor().submit(fn, *args).result()
+            except BrokenProcessPool:
+                # un process du pool a été tué : on repart d'un pool neuf
+                with _pool_lock:
+                    if _pool is not None:
+                        _pool.shutdown(wait=False)
+                    _reset_pool()
+                return _executor().submit(fn, *args).result()
+        finally:
+            _slots.release()
+    finally:
+        metrics.PASSWORD_HASH_LATENCY.labels(operation=operation).observe(time.perf_counter() - start)
+
+
+def hash_password(password):
+    return _run('hash', compute_hash, PASSWORD_HASH_METHOD, PASSWORD_HASH_COST, password)
+
+
+def verify_password(stored, password):
+    return _run('verify', compute_check, stored, password)
+
+
+def needs_rehash(stored):
+    if stored.startswith('$2'):
+        return PASSWORD_HASH_METHOD != 'bcrypt' or int(stored.split('$')[2]) != PASSWORD_HASH_COST
+    return PASSWORD_HASH_METHOD == 'bcrypt' or stored.split('$', 1)[0] != werkzeug_method(
+        PASSWORD_HASH_METHOD, PASSWORD_HASH_COST
+    )
+
+
+def init_app(app):
+    @app.errorhandler(HashingBusy)
+    def hashing_busy(exc):
+        response = jsonify({"error": "Service momentanément surchargé, réessayez plus tard"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
@@ -0,0 +1,119 @@
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from flask import g, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL_MS', 5)) / 1000
+PROFILE_MAX_PER_MINUTE = int(os.getenv('PROFILE_MAX_PER_MINUTE', 6))
+PROFILE_MAX_DISK_MB = int(os.getenv('PROFILE_MAX_DISK_MB', 100))
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/aeedk_profiles')
+PROFILE_HEADER = 'X-Profile'
+
+_budget_lock = threading.Lock()
+_budget = {'window': 0, 'count': 0}
+
+
+class StackSampler(threading.Thread):
+    # Échantillonneur statistique : relève la pile du thread cible à intervalle fixe
+    # et accumule des piles "repliées" (format attendu par flamegraph.pl / speedscope).
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _take_budget():
+    minute = int(time.time() // 60)
+    with _budget_lock:
+        if _budget['window'] != minute:
+            _budget['window'] = minute
+            _budget['count'] = 0
+        if _budget['count'] >= PROFILE_MAX_PER_MINUTE:
+            return False
+        _budget['count'] += 1
+        return True
+
+
+def _requested_by_admin():
+    if request.headers.get(PROFILE_HEADER) != '1':
+        return False
+    from models.user import User
+    try:
+        verify_jwt_in_request(optional=True)
+        user_id = get_jwt_identity()
+    except Exception:
+        return False
+    user = User.query.get(user_id) if user_id else None
+    return bool(user and user.role == 'admin')
+
+
+def _enforce_disk_cap():
+    entries = [e for e in os.scandir(PROFILE_DIR) if e.is_file()]
+    total = sum(e.stat().st_size for e in entries)
+    limit = PROFILE_MAX_DISK_MB * 1024 * 1024
+    for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+        if total <= limit:
+            break
+        total -= entry.stat().st_size
+        os.remove(entry.path)
+
+
+def _write_profile(sampler, duration):
+    rule = request.url_rule.rule if request.url_rule else 'unmatched'
+    route = re.sub(r'[^A-Za-z0-9]+', '_', rule).strip('_') or 'root'
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    filename = f"{time.strftime('%Y%m%dT%H%M%S')}_{os.getpid()}_{request.method}_{route}_{int(duration * 1000)}ms.collapsed"
+    path = os.path.join(PROFILE_DIR, filename)
+    with open(path, 'w') as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    _enforce_disk_cap()
+    return path
+
+
+def init_app(app):
+    @app.before_request
+    def start_profiling():
+        sampled = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+        if not (sampled or _requested_by_admin()) or not _take_budget():
+            return
+        sampler = StackSampler(threading.get_ident())
+        g.profile = (sampler, time.perf_counter())
+        sampler.start()
+
+    @app.teardown_request
+    def stop_profiling(exc):
+        # teardown s'exécute après la sérialisation JSON : elle est donc incluse dans le profil
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        sampler, start = profile
+        sampler.stop()
+        try:
+            _write_profile(sampler, time.perf_counter() - start)
+        except OSError:
+            app.logger.exception("Impossible d'écrire le profil")
@@ -0,0 +1,153 @@
+import os
+from datetime import datetime
+from sqlalchemy import case, func, insert, select, update
+from extensions import db
+from models.comment import Comment
+from models.like import Like
+from models.post import Post
+from models.post_score import PostScore
+
+# score = engagement / (âge en heures + 2) ^ gravité : un post récent et actif remonte,
+# puis redescend à mesure qu'il vieillit. Les posts "à la une" sont épinglés en tête.
+TRENDING_GRAVITY = float(os.getenv('TRENDING_GRAVITY', 1.5))
+TRENDING_COMMENT_WEIGHT = float(os.getenv('TRENDING_COMMENT_WEIGHT', 2))
+TRENDING_VIEW_WEIGHT = float(os.getenv('TRENDING_VIEW_WEIGHT', 0.1))
+
+
+def compute_score(likes, dislikes, comments, views, created_at, now=None):
+    now = now or datetime.utcnow()
+    age_hours = max((now - created_at).total_seconds() / 3600, 0) if created_at else 0
+    engagement = likes - dislikes + TRENDING_COMMENT_WEIGHT * comments + TRENDING_VIEW_WEIGHT * (views or 0)
+    return engagement / (age_hours + 2) ** TRENDING_GRAVITY
+
+
+def _vote_counts(post_filter=None):
+    query = select(
+        Like.content_id,
+        func.sum(case((Like.is_like == True, 1), else_=0)),
+        func.sum(case((Like.is_like == False, 1), else_=0)),
+    ).where(Like.content_type == 'post').group_by(Like.content_id)
+    if post_filter is not None:
+        query = query.where(Like.content_id == post_filter)
+    return {post_id: (int(likes or 0), int(dislikes or 0)) for post_id, likes, dislikes in db.session.execute(query)}
+
+
+def _comment_counts(post_filter=None):
+    query = select(Comment.post_id, func.count(Comment.id)).group_by(Comment.post_id)
+    if post_filter is not None:
+        query = query.where(Comment.post_id == post_filter)
+    return dict(db.session.execute(query).all())
+
+
+def refresh_post(post_id):
+    # recalcul complet d'un post (repli quand sa ligne post_scores manque) ; le commit reste à l'appelant
+    post = db.session.execute(
+        select(Post.created_at, Post.views, Post.is_featured).where(Post.id == post_id)
+    ).first()
+    if post is None:
+        return None
+    likes, dislikes = _vote_counts(post_id).get(post_id, (0, 0))
+    comments = _comment_counts(post_id).get(post_id, 0)
+    row = db.session.get(PostScore, post_id)
+    if row is None:
+        row = PostScore(post_id=post_id)
+        db.session.add(row)
+    row.likes, row.dislikes, row.comments = likes, dislikes, comments
+    row.is_pinned = bool(post.is_featured)
+    row.score = compute_score(likes, dislikes, comments, post.views, post.created_at)
+    row.refreshed_at = datetime.utcnow()
+    return row
+
+
+def add_post(post):
+    # un post neuf n'a ni vote ni commentaire : rien à recompter
+    db.session.add(PostScore(
+        post_id=post.id, is_pinned=bool(post.is_featured),
+        score=compute_score(0, 0, 0, post.views, post.created_at), refreshed_at=datetime.utcnow(),
+    ))
+
+
+def pin_post(post_id, is_pinned):
+    db.session.execute(
+        update(PostScore).where(PostScore.post_id == post_id).values(is_pinned=bool(is_pinned))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _bump(post_id, created_at, likes=0, dislikes=0, comments=0):
+    # variante sans lecture de refresh_post : une seule instruction ajoute les deltas aux compteurs
+    # et au score leur contribution à l'âge actuel du post ; le rafraîchissement complet corrige la dérive.
+    contribution = compute_score(likes, dislikes, comments, 0, created_at)
+    result = db.session.execute(
+        update(PostScore).where(PostScore.post_id == post_id).values(
+            likes=PostScore.likes + likes,
+            dislikes=PostScore.dislikes + dislikes,
+            comments=PostScore.comments + comments,
+            score=PostScore.score + contribution,
+        ).execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        refresh_post(post_id)
+
+
+def bump_comments(post_id, created_at, delta):
+    _bump(post_id, created_at, comments=delta)
+
+
+def bump_votes(post_id, created_at, likes, dislikes):
+    if likes or dislikes:
+        _bump(post_id, created_at, likes=likes, dislikes=dislikes)
+
+
+def refresh_all():
+    now = datetime.utcnow()
+    votes = _vote_counts()
+    comments = _comment_counts()
+    existing = set(db.session.scalars(select(PostScore.post_id)))
+    updates, inserts = [], []
+    for post_id, created_at, views, is_featured in db.session.execute(
+        select(Post.id, Post.created_at, Post.views, Post.is_featured)
+    ):
+        likes, dislikes = votes.get(post_id, (0, 0))
+        row = {
+            "post_id": post_id,
+            "likes": likes,
+            "dislikes": dislikes,
+            "comments": comments.get(post_id, 0),
+            "is_pinned": bool(is_featured),
+            "score": compute_score(likes, dislikes, comments.get(post_id, 0), views, created_at, now),
+            "refreshed_at": now,
+        }
+        (updates if post_id in existing else inserts).append(row)
+    if updates:
+        db.session.execute(update(PostScore), updates)
+    if inserts:
+        db.session.execute(insert(PostScore), inserts)
+    db.session.commit()
+    return len(updates) + len(inserts)
+
+
+def _trending(query):
+    # parcours de post_scores dans l'ordre exact de ix_post_scores_rank (post_id : clé primaire,
+    # départage) puis jointure des posts : une page classée coûte autant qu'une page chronologique.
+    # Chaque post a sa ligne dès sa création (add_post), refresh_all comble les manques.
+    return query.select_from(PostScore).join(Post, Post.id == PostScore.post_id).order_by(
+        PostScore.is_pinned.desc(), PostScore.score.desc(), PostScore.post_id.desc()
+    )
+
+
+def trending_query():
+    return _trending(db.session.query(Post))
+
+
+def trending_select():
+    # même tri, pour les sessions hors Flask-SQLAlchemy (routes asynchrones)
+    return _trending(select(Post))
+
+
+def init_app(app):
+    @app.cli.command('refresh-trending')
+    def refresh_trending_command():
+        # à planifier (cron Render) : le déclin temporel n'avance qu'au rafraîchissement complet
+        count = refresh_all()
+        print(f"{count} scores de posts rafraîchis")
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+
+STARTUP_REPORT = os.getenv('STARTUP_REPORT', 'False') == 'True'
+
+
+def _process_age():
+    # âge du process en secondes d'après /proc (Linux uniquement, sinon None)
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    def __init__(self, origin=None):
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.last = self.origin
+        self.phases = []
+        self.first_request = None
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        return {
+            "phases_ms": {name: round(duration * 1000, 1) for name, duration in self.phases},
+            "total_ms": round((self.last - self.origin) * 1000, 1),
+            "first_request_ms": round(self.first_request * 1000, 1) if self.first_request is not None else None,
+        }
+
+    def init_app(self, app):
+        app.extensions['startup'] = self
+        process_age = _process_age()
+        if STARTUP_REPORT:
+            lines = [f"  {name:<20} {duration * 1000:8.1f} ms" for name, duration in self.phases]
+            age = f"{process_age * 1000:.0f} ms" if process_age is not None else "n/a"
+            sys.stderr.write(
+                f"[startup pid={os.getpid()}] process age {age}\n" + "\n".join(lines) +
+                f"\n  {'total':<20} {(self.last - self.origin) * 1000:8.1f} ms\n"
+            )
+
+        @app.before_request
+        def record_first_request():
+            if self.first_request is None:
+                self.first_request = time.perf_counter() - self.origin
+                if STARTUP_REPORT:
+                    sys.stderr.write(
+                        f"[startup pid={os.getpid()}] first request after {self.first_request * 1000:.1f} ms\n"
+                    )
@@ -0,0 +1,261 @@
+import hashlib
+import hmac
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from flask import current_app, url_for
+from extensions import cloudinary_uploader
+
+UPLOAD_BACKEND = os.getenv('UPLOAD_BACKEND', 'cloudinary')
+SIGNED_UPLOAD_TTL = int(os.getenv('SIGNED_UPLOAD_TTL', 600))
+# preset Cloudinary signé (facultatif), pour les contrôles configurés côté Cloudinary
+CLOUDINARY_UPLOAD_PRESET = os.getenv('CLOUDINARY_UPLOAD_PRESET')
+LOCAL_BLOB_DIR = os.path.join('media', 'blobs')
+BLOB_FOLDER = 'blobs_aeedk'
+
+VIDEO_EXTENSIONS = {'mp4', 'webm'}
+UPLOAD_KINDS = {
+    'avatar': {
+        "folder": "avatars_aeedk",
+        "extensions": {'png', 'jpg', 'jpeg', 'gif'},
+        "max_bytes": int(os.getenv('AVATAR_UPLOAD_MAX_BYTES', 2 * 1024 * 1024)),
+    },
+    'post': {
+        "folder": "posts_aeedk",
+        "extensions": {'png', 'jpg', 'jpeg', 'gif'} | VIDEO_EXTENSIONS,
+        "max_bytes": int(os.getenv('POST_UPLOAD_MAX_BYTES', 100 * 1024 * 1024)),
+    },
+}
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+def file_extension(filename):
+    if not filename or '.' not in filename:
+        raise InvalidUpload("Format de fichier non autorisé")
+    return filename.rsplit('.', 1)[1].lower()
+
+
+def media_type(ext):
+    return 'video' if ext in VIDEO_EXTENSIONS else 'image'
+
+
+def blob_name(digest, ext):
+    return f"{digest[:2]}/{digest}.{ext}"
+
+
+def hash_stream(stream, max_bytes, directory=None):
+    # copie le flux dans un fichier temporaire en calculant le SHA-256 au passage
+    hasher = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: stream.read(64 * 1024), b''):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise InvalidUpload("Fichier trop volumineux")
+                hasher.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return hasher.hexdigest(), size, temp_path
+
+
+class LocalStorage:
+    # Même protocole signé que Cloudinary, mais les fichiers arrivent sur /api/uploads/local/<key>
+    # et sont rangés sous media/blobs : permet de tester le flux complet hors ligne.
+    name = 'local'
+
+    def _sign(self, *parts):
+        message = ':'.join(str(p) for p in parts).encode()
+        return hmac.new(current_app.config['SECRET_KEY'].encode(), message, hashlib.sha256).hexdigest()
+
+    def sign_upload(self, kind, filename):
+        spec = UPLOAD_KINDS[kind]
+        ext = file_extension(filename)
+        if ext not in spec["extensions"]:
+            raise InvalidUpload("Format de fichier non autorisé")
+        key = f"{spec['folder']}/{uuid.uuid4()}.{ext}"
+        expires = int(time.time()) + SIGNED_UPLOAD_TTL
+        signature = self._sign('upload', key, expires, spec["max_bytes"])
+        return {
+            "backend": self.name,
+            "method": "PUT",
+            "upload_url": url_for('upload_bp.local_upload', key=key, expires=expires, signature=signature, _external=True),
+            "key": key,
+            "expires_at": expires,
+            "max_bytes": spec["max_bytes"],
+        }
+
+    def check_upload(self, key, expires, signature):
+        kind = next((k for k, spec in UPLOAD_KINDS.items() if key.startswith(spec['folder'] + '/')), None)
+        if kind is None or not expires or expires < time.time() or '..' in key:
+            raise InvalidUpload("Signature d'upload expirée ou invalide")
+        max_bytes = UPLOAD_KINDS[kind]["max_bytes"]
+        if not hmac.compare_digest(self._sign('upload', key, expires, max_bytes), signature or ''):
+            raise InvalidUpload("Signature d'upload expirée ou invalide")
+        return max_bytes
+
+    def store(self, key, expires, stream, max_bytes):
+        # Le fichier est rangé sous son empreinte : un contenu déjà connu n'est pas dupliqué.
+        # La signature est consommée et le blob enregistré (ref_count 0) dans la transaction de
+        # l'appelant : un upload jamais confirmé reste visible du ramasse-miettes (gc-media).
+        from services import media_store
+        media_store.claim_upload(key, expires)
+        ext = file_extension(key)
+        os.makedirs(LOCAL_BLOB_DIR, exist_ok=True)
+        digest, size, temp_path = hash_stream(stream, max_bytes, LOCAL_BLOB_DIR)
+        blob_key = f"blobs/{blob_name(digest, ext)}"
+        url = self.put_blob(digest, ext, temp_path)
+        media_store.register_blob(digest, url, self.name, ext, size)
+        return {"key": blob_key, "bytes": size, "signature": self._sign('stored', blob_key, size)}
+
+    def confirm(self, kind, ref):
+        from services import media_store
+        key, size = ref.get('key') or '', ref.get('bytes')
+        if not key.startswith('blobs/') or '..' in key:
+            raise InvalidUpload("Référence de média invalide")
+        if not hmac.compare_digest(self._sign('stored', key, size), str(ref.get('signature') or '')):
+            raise InvalidUpload("Référence de média invalide")
+        ext = file_extension(key)
+        if ext not in UPLOAD_KINDS[kind]["extensions"]:
+            raise InvalidUpload("Format de fichier non autorisé")
+        path = os.path.join('media', key)
+        if not os.path.isfile(path):
+            raise InvalidUpload("Média introuvable")
+        digest = os.path.basename(key).rsplit('.', 1)[0]
+        blob = media_store.register_blob(digest, self.blob_url(digest, ext), self.name, ext, int(size))
+        return {
+            "url": blob.url,
+            "filename": ref.get('original_filename') or os.path.basename(key),
+            "type": media_type(ext),
+        }
+
+    def blob_url(self, digest, ext):
+        return url_for('media', filename=f"blobs/{blob_name(digest, ext)}", _external=True)
+
+    def put_blob(self, digest, ext, temp_path):
+        path = os.path.join(LOCAL_BLOB_DIR, blob_name(digest, ext))
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        return self.blob_url(digest, ext)
+
+    def delete_blob(self, digest, ext):
+        path = os.path.join(LOCAL_BLOB_DIR, blob_name(digest, ext))
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class CloudinaryStorage:
+    # Le client envoie le fichier directement à Cloudinary avec les paramètres signés ;
+    # l'API vérifie ensuite la signature de la réponse Cloudinary avant d'enregistrer l'URL.
+    # Cloudinary applique allowed_formats mais n'a pas de limite de taille par upload :
+    # la taille réelle est relue à la confirmation et le fichier supprimé s'il dépasse.
+    name = 'cloudinary'
+
+    def sign_upload(self, kind, filename):
+        import cloudinary
+        import cloudinary.utils
+        cloudinary_uploader()
+        spec = UPLOAD_KINDS[kind]
+        ext = file_extension(filename)
+        if ext not in spec["extensions"]:
+            raise InvalidUpload("Format de fichier non autorisé")
+        config = cloudinary.config()
+        resource_type = media_type(ext)
+        params = {
+            "timestamp": int(time.time()),
+            "folder": spec["folder"],
+            "public_id": f"{uuid.uuid4()}_{kind}",
+            "allowed_formats": ",".join(sorted(spec["extensions"])),
+        }
+        if CLOUDINARY_UPLOAD_PRESET:
+            params["upload_preset"] = CLOUDINARY_UPLOAD_PRESET
+        params["signature"] = cloudinary.utils.api_sign_request(params, config.api_secret)
+        params["api_key"] = config.api_key
+        return {
+            "backend": self.name,
+            "method": "POST",
+            "upload_url": f"https://api.cloudinary.com/v1_1/{config.cloud_name}/{resource_type}/upload",
+            "fields": params,
+            "expires_at": params["timestamp"] + SIGNED_UPLOAD_TTL,
+            "max_bytes": spec["max_bytes"],
+        }
+
+    def confirm(self, kind, ref):
+        import cloudinary.api
+        import cloudinary.utils
+        cloudinary_uploader()
+        public_id, version, signature = ref.get('public_id') or '', ref.get('version'), ref.get('signature')
+        if not public_id.startswith(UPLOAD_KINDS[kind]['folder'] + '/') or not version or not signature:
+            raise InvalidUpload("Référence de média invalide")
+        if not cloudinary.utils.verify_api_response_signature(public_id, version, signature):
+            raise InvalidUpload("Référence de média invalide")
+        resource_type = ref.get('resource_type') if ref.get('resource_type') in ('image', 'video') else 'image'
+        # taille et format lus chez Cloudinary, pas dans la référence fournie par le client
+        try:
+            resource = cloudinary.api.resource(public_id, resource_type=resource_type)
+        except cloudinary.api.NotFound:
+            raise InvalidUpload("Référence de média invalide")
+        fmt = re.sub(r'[^a-z0-9]', '', str(resource.get('format') or '').lower())
+        if resource.get('bytes', 0) > UPLOAD_KINDS[kind]["max_bytes"] or fmt not in UPLOAD_KINDS[kind]["extensions"]:
+            cloudinary_uploader().destroy(public_id, resource_type=resource_type)
+            raise InvalidUpload("Fichier trop volumineux ou format non autorisé")
+        url, _ = cloudinary.utils.cloudinary_url(
+            f"{public_id}.{fmt}" if fmt else public_id,
+            resource_type=resource_type, version=version, secure=True
+        )
+        return {
+            "url": url,
+            "filename": f"{ref.get('original_filename') or public_id.rsplit('/', 1)[-1]}.{fmt}" if fmt else public_id,
+            "type": resource_type,
+        }
+
+    def put_blob(self, digest, ext, temp_path):
+        # public_id dérivé de l'empreinte + overwrite=False : un contenu déjà présent
+        # chez Cloudinary n'est pas réécrit
+        result = cloudinary_uploader().upload(
+            temp_path,
+            folder=BLOB_FOLDER,
+            public_id=digest,
+            overwrite=False,
+            resource_type=media_type(ext),
+        )
+        return result["secure_url"]
+
+    def delete_blob(self, digest, ext):
+        cloudinary_uploader().destroy(f"{BLOB_FOLDER}/{digest}", resource_type=media_type(ext))
+
+
+BACKENDS = {'local': LocalStorage(), 'cloudinary': CloudinaryStorage()}
+
+
+def get_storage():
+    return BACKENDS[current_app.config.get('UPLOAD_BACKEND', UPLOAD_BACKEND)]
+
+
+def confirm_refs(kind, raw):
+    # raw : référence(s) renvoyée(s) par le stockage après l'upload direct, en objet JSON
+    # ou en chaîne JSON (champ de formulaire multipart)
+    if not raw:
+        return []
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            raise InvalidUpload("Référence de média invalide")
+    refs = raw if isinstance(raw, list) else [raw]
+    if not all(isinstance(ref, dict) for ref in refs):
+        raise InvalidUpload("Référence de média invalide")
+    storage = get_storage()
+    return [storage.confirm(kind, ref) for ref in refs]
@@ -0,0 +1,126 @@
+import base64
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, func, select, tuple_
+from extensions import db
+from models.comment import Comment
+from models.like import Like
+from models.post import Post
+from models.tombstone import Tombstone
+from services import loading
+
+# Synchronisation incrémentale : le jeton encode l'instant de la dernière synchronisation et
+# chaque section ne lit que les lignes modifiées depuis, via les index sur updated_at.
+# Le jeton suivant recule de SYNC_OVERLAP_SECONDS pour rattraper les transactions validées
+# en retard : le client peut donc recevoir deux fois le même élément et doit dédoublonner par id.
+SYNC_MAX_ITEMS = int(os.getenv('SYNC_MAX_ITEMS', 200))
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', 5))
+SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', 30))
+
+
+class ExpiredToken(ValueError):
+    pass
+
+
+def encode_token(moment):
+    return base64.urlsafe_b64encode(moment.isoformat().encode()).decode()
+
+
+def decode_token(token):
+    # toutes les erreurs de décodage (base64, utf-8, format) sont des ValueError
+    since = datetime.fromisoformat(base64.urlsafe_b64decode(token.encode()).decode())
+    # au-delà de la rétention des pierres tombales, des suppressions ont pu être oubliées
+    if since < datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_DAYS):
+        raise ExpiredToken(token)
+    return since
+
+
+def initial_token():
+    # point de départ d'un client qui vient de charger le fil complet
+    return encode_token(datetime.utcnow() - timedelta(seconds=SYNC_OVERLAP_SECONDS))
+
+
+def _changed(model, column, since, limit, options=()):
+    # options : profil de chargement de services/loading.py, pour que la sérialisation
+    # ne relance aucune requête par élément
+    return db.session.scalars(
+        select(model).options(*options).where(column >= since).order_by(column, model.id).limit(limit + 1)
+    ).all()
+
+
+def _vote_changes(since, limit):
+    touched = db.session.execute(
+        select(Like.content_type, Like.content_id, func.max(Like.updated_at).label('changed_at'))
+        .where(Like.updated_at >= since)
+        .group_by(Like.content_type, Like.content_id)
+        .order_by('changed_at')
+        .limit(limit + 1)
+    ).all()
+    if not touched:
+        return [], []
+    keys = [(content_type, content_id) for content_type, content_id, _ in touched[:limit]]
+    counts = {
+        (content_type, content_id): (likes, dislikes)
+        for content_type, content_id, likes, dislikes in db.session.execute(
+            select(
+                Like.content_type, Like.content_id,
+                func.count(case((Like.is_like == True, 1))),
+                func.count(case((Like.is_like == False, 1))),
+            )
+            .where(tuple_(Like.content_type, Like.content_id).in_(keys))
+            .group_by(Like.content_type, Like.content_id)
+        )
+    }
+    votes = [
+        {"content_type": content_type, "content_id": content_id,
+         "likes": counts[(content_type, content_id)][0], "dislikes": counts[(content_type, content_id)][1]}
+        for content_type, content_id in keys
+    ]
+    return votes, [changed_at for _, _, changed_at in touched]
+
+
+def changes(since):
+    started = datetime.utcnow()
+    posts = _changed(Post, Post.updated_at, since, SYNC_MAX_ITEMS, loading.profile('feed'))
+    comments = _changed(
+        Comment, Comment.updated_at, since, SYNC_MAX_ITEMS, loading.profile('comment_thread', depth=0)
+    )
+    tombstones = _changed(Tombstone, Tombstone.deleted_at, since, SYNC_MAX_ITEMS)
+    votes, vote_times = _vote_changes(since, SYNC_MAX_ITEMS)
+
+    # une section tronquée fixe le prochain point de départ ; les autres sections
+    # seront en partie renvoyées au prochain appel, d'où le dédoublonnage côté client
+    cutoffs = [
+        times[SYNC_MAX_ITEMS - 1] for times in (
+            [p.updated_at for p in posts],
+            [c.updated_at for c in comments],
+            [t.deleted_at for t in tombstones],
+            vote_times,
+        ) if len(times) > SYNC_MAX_ITEMS
+    ]
+    has_more = bool(cutoffs)
+    next_since = min(cutoffs) if has_more else started - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+    return {
+        "posts": [post.to_dict() for post in posts[:SYNC_MAX_ITEMS]],
+        "comments": [comment.to_dict(max_depth=0) for comment in comments[:SYNC_MAX_ITEMS]],
+        "votes": votes,
+        "deleted": [tombstone.to_dict() for tombstone in tombstones[:SYNC_MAX_ITEMS]],
+        "has_more": has_more,
+        "token": encode_token(max(next_since, since)),
+    }
+
+
+def prune_tombstones(days=SYNC_TOMBSTONE_DAYS):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = db.session.execute(
+        delete(Tombstone).where(Tombstone.deleted_at < cutoff).execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+
+def init_app(app):
+    @app.cli.command('prune-tombstones')
+    def prune_tombstones_command():
+        # à planifier (cron Render) : les jetons plus anciens que la rétention imposent un rechargement complet
+        print(f"{prune_tombstones()} pierres tombales supprimées")
@@ -0,0 +1,123 @@
+from datetime import datetime
+from sqlalchemy import and_, case, func, literal, null, select
+from sqlalchemy.dialects import mysql, sqlite
+from extensions import db
+from models.comment import Comment
+from models.like import Like
+from models.post import Post
+
+CONTENT_MODELS = {'post': Post, 'comment': Comment}
+VOTE_COLUMNS = ['user_id', 'content_type', 'content_id', 'is_like', 'created_at', 'updated_at']
+
+
+VOTE_OUTCOMES = ('created', 'switched', 'removed', 'unchanged')
+
+
+def _upsert_statement(dialect, user_id, content_type, content_id, is_like, toggle):
+    target = CONTENT_MODELS[content_type]
+    now = datetime.utcnow()
+    # INSERT ... SELECT : aucune ligne n'est insérée si le contenu n'existe pas,
+    # ce qui remplace la vérification d'existence préalable.
+    source = select(
+        literal(int(user_id)), literal(content_type), literal(content_id),
+        literal(is_like), literal(now), literal(now)
+    ).where(target.id == content_id)
+    table = Like.__table__
+    if dialect == 'mysql':
+        stmt = mysql.insert(table).from_select(VOTE_COLUMNS, source)
+        proposed = stmt.inserted.is_like
+    else:
+        stmt = sqlite.insert(table).from_select(VOTE_COLUMNS, source)
+        proposed = stmt.excluded.is_like
+    # re-voter la même chose annule le vote (is_like = NULL) plutôt que de supprimer la ligne :
+    # la bascule tient ainsi dans une seule instruction atomique.
+    new_value = case((table.c.is_like == proposed, null()), else_=proposed) if toggle else proposed
+    # previous_is_like garde la valeur écrasée : le résumé relu ensuite en déduit l'issue du vote
+    # sans lecture préalable. MySQL applique les affectations dans l'ordre en voyant les valeurs
+    # déjà modifiées : is_like doit donc venir en dernier (SQLite lit toujours l'ancienne ligne).
+    assignments = [
+        ('previous_is_like', table.c.is_like),
+        ('updated_at', case((table.c.is_like == new_value, table.c.updated_at), else_=now)),
+        ('is_like', new_value),
+    ]
+    if dialect == 'mysql':
+        return stmt.on_duplicate_key_update(assignments)
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id', 'content_type', 'content_id'], set_=dict(assignments),
+    )
+
+
+def _vote_code(column, user_id):
+    # 1 : like, -1 : dislike, NULL : pas de vote de cet utilisateur
+    return func.max(case(
+        (and_(Like.user_id == user_id, column == True), 1),
+        (and_(Like.user_id == user_id, column == False), -1),
+    ))
+
+
+def _summary(content_type, content_id, user_id, session, *extra):
+    user_vote = _vote_code(Like.is_like, user_id) if user_id else null()
+    return session.execute(select(
+        func.count(case((Like.is_like == True, 1))),
+        func.count(case((Like.is_like == False, 1))),
+        user_vote,
+        *extra,
+    ).where(Like.content_type == content_type, Like.content_id == content_id)).one()
+
+
+def vote_summary(content_type, content_id, user_id=None, session=None):
+    # session : celle du chemin de lecture asynchrone (run_sync), sinon celle de Flask
+    session = session if session is not None else db.session
+    likes, dislikes, vote = _summary(content_type, content_id, user_id, session)
+    return {"likes": likes, "dislikes": dislikes, "user_vote": vote}
+
+
+def _outcome(previous, current):
+    if previous == current:
+        return 'unchanged'
+    if current is None:
+        return 'removed'
+    return 'created' if previous is None else 'switched'
+
+
+def vote_delta(previous, current):
+    # (delta likes, delta dislikes) entre deux votes codés 1 / -1 / None
+    return (current == 1) - (previous == 1), (current == -1) - (previous == -1)
+
+
+def cast_vote(user_id, content_type, content_id, is_like, toggle=True):
+    # Renvoie None si le contenu n'existe pas, sinon un dict : outcome (voir VOTE_OUTCOMES),
+    # delta (likes, dislikes), summary (compteurs à jour) et, pour un post, sa date de création.
+    # Deux instructions : l'upsert, puis le résumé. Le commit reste à l'appelant.
+    dialect = db.session.get_bind(mapper=Like.__mapper__).dialect.name
+    result = db.session.execute(_upsert_statement(dialect, user_id, content_type, content_id, is_like, toggle))
+    if result.rowcount == 0:
+        return None
+    extra = [_vote_code(Like.previous_is_like, user_id)]
+    if content_type == 'post':
+        extra.append(select(Post.created_at).where(Post.id == content_id).scalar_subquery())
+    likes, dislikes, vote, previous, *created_at = _summary(content_type, content_id, user_id, db.session, *extra)
+    return {
+        "outcome": _outcome(previous, vote),
+        "delta": vote_delta(previous, vote),
+        "summary": {"likes": likes, "dislikes": dislikes, "user_vote": vote},
+        "created_at": created_at[0] if created_at else None,
+    }
+
+
+def post_created_at(post_id):
+    return db.session.scalar(select(Post.created_at).where(Post.id == post_id))
+
+
+def retract_vote(user_id, content_type, content_id):
+    # Annule le vote (is_like = NULL, la ligne reste visible pour /api/sync). Renvoie None s'il
+    # n'y avait pas de vote, sinon le delta (likes, dislikes). Le commit reste à l'appelant.
+    like = Like.query.filter_by(user_id=user_id, content_type=content_type, content_id=content_id)\
+        .filter(Like.is_like.isnot(None)).first()
+    if like is None:
+        return None
+    previous = 1 if like.is_like else -1
+    like.previous_is_like = like.is_like
+    like.is_like = None
+    like.updated_at = datetime.utcnow()
+    return vote_delta(previous, None)
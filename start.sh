@@ -1,2 +1,8 @@
 #!/bin/bash
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/aeedk_metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+if [ "$APP_SERVER" = "asgi" ]; then
+    # routes de lecture asynchrones (polling, SSE) + app Flask pour le reste, voir asgi.py
+    exec uvicorn asgi:app --host=0.0.0.0 --port=$PORT --workers=${WEB_CONCURRENCY:-1}
+fi
 gunicorn wsgi:app --bind=0.0.0.0:$PORT
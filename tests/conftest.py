@@ -0,0 +1,12 @@
+import os
+import sys
+
+# configuration lue à l'import des modules de l'app : à fixer avant tout import
+os.environ.setdefault('ADMISSION_ENABLED', 'False')
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+os.environ.setdefault('PASSWORD_HASH_COST', '1000')
+os.environ.setdefault('PROFILE_SAMPLE_RATE', '0')
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+os.environ.pop('DATABASE_REPLICA_URL', None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import create_app
+from extensions import db
+from models.comment import COMMENT_MAX_DEPTH, Comment
+from models.like import Like
+from models.post import Post
+from models.user import User
+from services import sync
+
+# Chaque profil de services/loading.py doit rendre le nombre de requêtes SQL de sa route
+# indépendant du volume : mêmes comptes avec un petit et un grand jeu de données.
+SIZES = (2, 6)
+
+
+def populate(size):
+    users = [
+        User(username=f"user{i}", email=f"user{i}@example.com", role='admin' if i == 0 else 'membre', confirmed=True)
+        for i in range(size)
+    ]
+    for user in users:
+        user.set_password('pw')
+    db.session.add_all(users)
+    db.session.flush()
+    posts = []
+    for author in users:
+        post = Post(title=f"post {author.id}", content='contenu', author_id=author.id)
+        db.session.add(post)
+        db.session.flush()
+        posts.append(post)
+        for voter in users:
+            db.session.add(Like(user_id=voter.id, content_type='post', content_id=post.id, is_like=voter.id % 2 == 0))
+        for root in range(size):
+            # fils de discussion plus profonds que COMMENT_MAX_DEPTH
+            parent_id = None
+            for level in range(COMMENT_MAX_DEPTH + 2):
+                comment = Comment(
+                    content=f"c{root}-{level}", user_id=users[(root + level) % size].id,
+                    post_id=post.id, parent_comment_id=parent_id,
+                )
+                db.session.add(comment)
+                db.session.flush()
+                db.session.add(Like(user_id=users[level % size].id, content_type='comment', content_id=comment.id, is_like=True))
+                parent_id = comment.id
+    db.session.commit()
+    return users[0].id, posts[0].id
+
+
+def count_queries(monkeypatch, tmp_path, size, route):
+    # base neuve par volume : renvoie le nombre de requêtes SQL émises par la route
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / f'loading_{size}.db'}")
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        admin_id, post_id = populate(size)
+        token = create_access_token(identity=str(admin_id))
+        since = sync.encode_token(datetime.utcnow() - timedelta(minutes=5))
+        queries = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+    path, headers = ROUTES[route]({'post_id': post_id, 'token': token, 'since': since})
+    response = app.test_client().get(path, headers=headers)
+    assert response.status_code == 200
+    with app.app_context():
+        db.engine.dispose()
+    return len(queries)
+
+
+ROUTES = {
+    'feed': lambda ids: ('/api/posts', {}),
+    'post_detail': lambda ids: (f"/api/posts/{ids['post_id']}", {}),
+    'comment_thread': lambda ids: (f"/api/comments/post/{ids['post_id']}", {}),
+    'admin_users': lambda ids: ('/api/user/admin/users', {'Authorization': f"Bearer {ids['token']}"}),
+    # tous les posts, commentaires et votes du jeu de données ont changé depuis le jeton
+    'sync': lambda ids: (f"/api/sync?since={ids['since']}", {}),
+}
+
+
+@pytest.mark.parametrize('route', sorted(ROUTES))
+def test_query_count_is_constant(tmp_path, monkeypatch, route):
+    small, large = (count_queries(monkeypatch, tmp_path, size, route) for size in SIZES)
+    assert small == large